@@ -0,0 +1,232 @@
+import os
+import tempfile
+from subprocess import check_call
+import shutil
+import unittest
+from unittest import mock
+
+from vcp import VCP
+from vcp.project import Project
+from vcp.commands import ProjectCommand, RepositoryCommand
+from vcp.exceptions import ProjectException
+
+class FakeConfigLoader(object):
+
+    def __init__(self, config):
+        self.config = config
+
+    def load(self, filename):
+        self.filename = filename
+        return self.config
+
+class TestProjectInitRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.vcp = VCP(FakeConfigLoader({}))
+        self.vcp.save_config = lambda: None
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {}, system_dependencies = {}, languages = [])
+        self.vcp.projects['p1'] = Project('p1', self.vcp, data)
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def init_project(self, transient):
+        def init(project, *args, **kwargs):
+            self.calls += 1
+            project.init_failure_transient = transient
+            return False
+
+        with mock.patch.object(Project, 'init', init), mock.patch('vcp.commands.time.sleep') as sleep:
+            ProjectCommand(self.vcp).init('p1', self.path, retries = 2)
+        return sleep
+
+    def test_permanent_failure_is_not_retried(self):
+        # Act
+        sleep = self.init_project(transient = False)
+
+        # Assert
+        self.assertEqual(self.calls, 1)
+        sleep.assert_not_called()
+
+    def test_transient_failure_is_retried(self):
+        # Act
+        sleep = self.init_project(transient = True)
+
+        # Assert
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+class TestRepositoryScan(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.vcp = VCP(FakeConfigLoader({}))
+        self.vcp.save_config = lambda: None
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_same_basenames_get_unique_names(self):
+        # Arrange
+        for path in ['x/.git', 'group/x/.git', 'group/x/x/.git']:
+            os.makedirs(os.path.join(self.root, path))
+
+        # Act
+        RepositoryCommand(self.vcp).scan(self.root)
+
+        # Assert
+        self.assertEqual(sorted(self.vcp.repositories), ['group/x', 'group/x/x', 'x'])
+
+class FakeRepository(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.path = '/' + name
+        self.last_returncode = None
+
+    def fetch(self):
+        self.last_returncode = 0
+        return 'fetched'
+
+    def pushables(self, remote):
+        # the last command is the tag grep, it fails if there is no unpushed tag
+        self.last_returncode = 1
+        return ['abc1234 commit']
+
+    def get_diff_numstat(self):
+        self.last_returncode = 0
+        return [dict(insertions = 3, deletions = 1, path = 'setup.py')]
+
+class FakeCommitIndex(object):
+
+    def __init__(self):
+        self.updated = []
+
+    def update(self, repo):
+        self.updated.append(repo.name)
+        repo.last_returncode = 128
+
+class TestProjectCollect(unittest.TestCase):
+
+    def setUp(self):
+        self.vcp = VCP(FakeConfigLoader({}))
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {}, system_dependencies = {}, languages = [])
+        self.project = Project('p1', self.vcp, data)
+        self.vcp.projects['p1'] = self.project
+        self.vcp.repositories = {'p1': FakeRepository('p1')}
+
+    def test_fetch_exit_status_is_not_changed_by_the_index(self):
+        # Act
+        with mock.patch.object(VCP, 'commit_index', new_callable = mock.PropertyMock, return_value = FakeCommitIndex()):
+            boxes = list(self.project.fetch())
+
+        # Assert
+        self.assertEqual(boxes[0].data['exit_status'], 0)
+        self.assertEqual(self.vcp.repositories['p1'].last_returncode, 128)
+
+    def test_numstat_lines(self):
+        # Act
+        boxes = list(self.project.diff(numstat = True))
+
+        # Assert
+        self.assertTrue(boxes[0].raw)
+        self.assertEqual(boxes[0].content, "3\t1\tp1/setup.py")
+        self.assertEqual(boxes[1].data['total']['insertions'], 3)
+
+    def test_no_exit_status_for_composite_results(self):
+        # Act
+        with mock.patch.object(VCP, 'commit_index', new_callable = mock.PropertyMock, return_value = None):
+            boxes = list(self.project.pushables(None))
+
+        # Assert
+        self.assertIsNone(boxes[0].data['exit_status'])
+
+class TestWorktreeInit(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.vcp = VCP(FakeConfigLoader({}))
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {}, system_dependencies = {}, languages = [])
+        self.vcp.projects['p1'] = Project('p1', self.vcp, data)
+        source = os.path.join(self.path, 'source', 'p1')
+        check_call(['git', 'init', '-q', source])
+        check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '-q', '--allow-empty', '-m', 'test'], cwd = source)
+        self.vcp.repositories['p1'] = self.vcp.repo_factory.create(source, 'git', 'p1')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_failed_save_removes_the_worktrees(self):
+        # Arrange
+        def save_config():
+            raise IOError('disk full')
+        self.vcp.save_config = save_config
+        workspace = os.path.join(self.path, 'ws')
+
+        # Act
+        with self.assertRaises(IOError):
+            ProjectCommand(self.vcp).init('p1', workspace, worktree_from = os.path.join(self.path, 'source'))
+
+        # Assert
+        self.assertEqual(list(self.vcp.repositories), ['p1'])
+        self.assertFalse(os.path.exists(os.path.join(workspace, 'p1')))
+
+class TestProjectNamespace(unittest.TestCase):
+
+    def setUp(self):
+        self.vcp = VCP(FakeConfigLoader({}))
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {'p2': 'master'}, system_dependencies = {}, languages = [])
+        self.project = Project('p1', self.vcp, data)
+        self.vcp.projects['p1'] = self.project
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {}, system_dependencies = {}, languages = [])
+        self.vcp.projects['p2'] = Project('p2', self.vcp, data)
+        self.vcp.repositories = {'p1': FakeRepository('p1'), 'ns/p1': FakeRepository('ns/p1')}
+        self.vcp.namespace = 'ns'
+
+    def test_repository_of_the_namespace(self):
+        # Assert
+        self.assertTrue(self.project.initialized)
+        self.assertEqual(self.project.path, '/ns/p1')
+        self.assertFalse(self.vcp.projects['p2'].initialized)
+
+    def test_update_does_not_init_in_a_namespace(self):
+        # Act & Assert
+        with self.assertRaises(ProjectException):
+            self.project.update('/ws', {})
+
+class TestProjectUpdate(unittest.TestCase):
+
+    def setUp(self):
+        self.vcp = VCP(FakeConfigLoader({}))
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {'p2': 'master'}, system_dependencies = {}, languages = [])
+        self.project = Project('p1', self.vcp, data)
+        self.vcp.projects['p1'] = self.project
+        data = dict(description = '', repo = dict(url = '', type = 'git'), dependencies = {}, system_dependencies = {}, languages = [])
+        self.vcp.projects['p2'] = Project('p2', self.vcp, data)
+        self.vcp.repositories = {'p1': FakeRepository('p1'), 'p2': FakeRepository('p2')}
+
+    def test_failed_fetch(self):
+        # Arrange
+        def fetch():
+            self.vcp.repositories['p2'].last_returncode = 128
+            return 'fatal: unable to access'
+        self.vcp.repositories['p2'].fetch = fetch
+        index = FakeCommitIndex()
+
+        def update_repository(project, status):
+            status[project.name] = True
+            return True
+
+        status = {}
+
+        # Act
+        with mock.patch.object(VCP, 'commit_index', new_callable = mock.PropertyMock, return_value = index), \
+             mock.patch.object(Project, 'update_repository', update_repository):
+            result = self.project.update('/ws', status)
+
+        # Assert
+        self.assertTrue(result)
+        self.assertEqual(status, {'p1': True, 'p2': False})
+        self.assertEqual(index.updated, ['p1'])
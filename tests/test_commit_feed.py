@@ -0,0 +1,33 @@
+import unittest
+from datetime import datetime
+
+from vcp.commit_feed import CommitRecord, merge_commits, group_by_day
+from vcp.repositories import GitRepository
+
+def timestamp(day, hour):
+    return int(datetime(2017, 1, day, hour).timestamp())
+
+class TestCommitFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.repo1 = GitRepository('/tmp/repo1', 'repo1')
+        self.repo2 = GitRepository('/tmp/repo2', 'repo2')
+        self.commits = {
+            'repo1': [CommitRecord(timestamp(1, 10), self.repo1, 'a1', 'me', 'first'), CommitRecord(timestamp(2, 10), self.repo1, 'a2', 'me', 'third')],
+            'repo2': [CommitRecord(timestamp(1, 11), self.repo2, 'b1', 'me', 'second'), CommitRecord(timestamp(2, 11), self.repo2, 'b2', 'me', 'fourth')],
+        }
+
+    def test_merge_commits(self):
+        # Act
+        commits = list(merge_commits([self.repo1, self.repo2], lambda repo: iter(self.commits[repo.name])))
+
+        # Assert
+        self.assertEqual([c.subject for c in commits], ['first', 'second', 'third', 'fourth'])
+
+    def test_group_by_day(self):
+        # Act
+        groups = list(group_by_day(merge_commits([self.repo1, self.repo2], lambda repo: iter(self.commits[repo.name]))))
+
+        # Assert
+        self.assertEqual([g.caption for g in groups], ['2017-01-01', '2017-01-02'])
+        self.assertEqual([c['sha'] for c in groups[1].data['commits']], ['a2', 'b2'])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import check_call
+
+from vcp.commit_index import CommitIndex
+from vcp.repositories import GitRepository
+
+class TestCommitIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.repo_path = os.path.join(self.path, 'repo')
+        os.mkdir(self.repo_path)
+        self.git('init', '-q')
+        self.git('config', 'user.name', 'tester')
+        self.git('config', 'user.email', 'tester@localhost')
+        self.commit('first')
+        self.git('tag', '-a', 'v1', '-m', 'v1')
+        self.commit('second')
+        self.repo = GitRepository(self.repo_path, 'repo')
+        self.index = CommitIndex(os.path.join(self.path, 'index.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def git(self, *args):
+        check_call(['git'] + list(args), cwd = self.repo_path)
+
+    def commit(self, message):
+        self.git('commit', '-q', '--allow-empty', '-m', message)
+
+    def test_update_is_incremental(self):
+        # Act
+        first_count = self.index.update(self.repo)
+        self.commit('third')
+        second_count = self.index.update(self.repo)
+
+        # Assert
+        self.assertEqual(first_count, 2)
+        self.assertEqual(second_count, 1)
+
+    def test_commits_from_last_tag(self):
+        # Arrange
+        self.index.update(self.repo)
+        self.commit('third')
+
+        # Act
+        commits = self.index.get_commits_from_last_tag(self.repo)
+
+        # Assert
+        self.assertEqual([c.split(' ', 1)[1] for c in commits], ['third', 'second'])
+
+    def test_search(self):
+        # Arrange
+        self.index.update(self.repo)
+
+        # Act
+        results = self.index.search('sec')
+
+        # Assert
+        self.assertEqual([(r[0], r[3]) for r in results], [('repo', 'second')])
+
+    def test_search_wildcards_are_literal(self):
+        # Arrange
+        self.commit('fix_it')
+        self.commit('fixAit 100%')
+        self.commit('version 10')
+        self.index.update(self.repo)
+
+        # Act
+        underscore = self.index.search('x_i')
+        percent = self.index.search('0%')
+
+        # Assert
+        self.assertEqual([r[3] for r in underscore], ['fix_it'])
+        self.assertEqual([r[3] for r in percent], ['fixAit 100%'])
+
+    def test_many_revisions(self):
+        # Arrange
+        missing = ['{:040x}'.format(idx + 1) for idx in range(5000)]
+        head = self.repo.cmd("git rev-parse HEAD").strip()
+
+        # Act
+        commits = list(self.repo.iter_commits([head], missing))
+
+        # Assert
+        self.assertEqual([c[4] for c in commits], ['first', 'second'])
@@ -0,0 +1,96 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from vcp.config_store import merge_config, SafeJSONConfigLoader
+
+class TestMergeConfig(unittest.TestCase):
+
+    def test_only_our_changes_applied(self):
+        # Arrange
+        base = dict(default_project = 'a', repositories = dict(r1 = dict(path = '/r1')))
+        ours = dict(default_project = 'a', repositories = dict(r1 = dict(path = '/r1'), r2 = dict(path = '/r2')))
+        theirs = dict(default_project = 'b', repositories = dict(r1 = dict(path = '/r1'), r3 = dict(path = '/r3')))
+
+        # Act
+        merged = merge_config(base, ours, theirs)
+
+        # Assert
+        self.assertEqual(merged['default_project'], 'b')
+        self.assertEqual(sorted(merged['repositories'].keys()), ['r1', 'r2', 'r3'])
+
+    def test_removal(self):
+        # Arrange
+        base = dict(repositories = dict(r1 = dict(path = '/r1'), r2 = dict(path = '/r2')))
+        ours = dict(repositories = dict(r2 = dict(path = '/r2')))
+        theirs = dict(repositories = dict(r1 = dict(path = '/r1'), r2 = dict(path = '/r2'), r3 = dict(path = '/r3')))
+
+        # Act
+        merged = merge_config(base, ours, theirs)
+
+        # Assert
+        self.assertEqual(sorted(merged['repositories'].keys()), ['r2', 'r3'])
+
+class TestSafeJSONConfigLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'test.vcp')
+        with open(self.filename, 'w') as f:
+            json.dump(dict(repositories = {}), f)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def create_loader(self):
+        loader = SafeJSONConfigLoader(os.path.join(self.path, 'dummy'))
+        return loader, loader.load('test.vcp')
+
+    def test_parallel_saves_are_merged(self):
+        # Arrange
+        loader1, config1 = self.create_loader()
+        loader2, config2 = self.create_loader()
+
+        # Act
+        config1['repositories']['r1'] = dict(path = '/r1')
+        loader1.save(config1)
+        config2['repositories']['r2'] = dict(path = '/r2')
+        loader2.save(config2)
+
+        # Assert
+        with open(self.filename) as f:
+            data = json.load(f)
+        self.assertEqual(sorted(data['repositories'].keys()), ['r1', 'r2'])
+        self.assertEqual([n for n in os.listdir(self.path) if n.endswith('.tmp')], [])
+
+    def test_create_writes_the_empty_default(self):
+        # Arrange
+        loader = SafeJSONConfigLoader(os.path.join(self.path, 'dummy'))
+
+        # Act
+        config = loader.load('created.vcp', create = self.path, default_conf = {})
+
+        # Assert
+        self.assertEqual(config, {})
+        with open(os.path.join(self.path, 'created.vcp')) as f:
+            self.assertEqual(json.load(f), {})
+
+    def test_repeated_saves_keep_the_external_changes(self):
+        # Arrange
+        loader, config = self.create_loader()
+        external, external_config = self.create_loader()
+
+        # Act
+        external_config['repositories']['r3'] = dict(path = '/r3')
+        external.save(external_config)
+        config['repositories']['r1'] = dict(path = '/r1')
+        loader.save(config)
+        config['repositories']['r2'] = dict(path = '/r2')
+        loader.save(config)
+
+        # Assert
+        with open(self.filename) as f:
+            data = json.load(f)
+        self.assertEqual(sorted(data['repositories'].keys()), ['r1', 'r2', 'r3'])
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from vcp.language_environments import JavascriptEnvironment
+
+class TestJavascriptEnvironmentStamp(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'node_modules'))
+        self.write_package_json('{"name": "test"}')
+        # the 'echo' command succeeds and returns its arguments, so the install returns b'install\n' when npm is called
+        self.env = self.create_env('echo')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def create_env(self, command, check_status = False):
+        return JavascriptEnvironment(self.path, npm_usage_config = dict(command_override = command, check_status = check_status))
+
+    def create_fake_npm(self, ls_returncode):
+        """The install succeeds, the 'ls' returns the given code"""
+        filename = os.path.join(self.path, 'fake_npm')
+        with open(filename, 'w') as f:
+            f.write('#!/bin/sh\n[ "$1" = ls ] && exit {}\necho "$@"\n'.format(ls_returncode))
+        os.chmod(filename, 0o755)
+        return filename
+
+    def write_package_json(self, content):
+        with open(os.path.join(self.path, 'package.json'), 'w') as f:
+            f.write(content)
+
+    def install(self, env):
+        env.install()
+        env.get_status()
+
+    def test_install_skipped_when_nothing_changed(self):
+        # Arrange
+        self.install(self.env)
+
+        # Act
+        result = self.env.install()
+
+        # Assert
+        self.assertEqual(result, b'')
+
+    def test_failed_install_is_not_stamped(self):
+        # Arrange
+        env = self.create_env('false')
+        self.install(env)
+
+        # Act
+        result = env.install()
+
+        # Assert
+        self.assertIsNone(result)
+        self.assertFalse(os.path.exists(env.stamp_filename))
+
+    def test_failed_status_check_is_not_stamped(self):
+        # Arrange
+        env = self.create_env(self.create_fake_npm(1), check_status = True)
+
+        # Act
+        env.install()
+        status = env.get_status()
+
+        # Assert
+        self.assertFalse(status)
+        self.assertFalse(os.path.exists(env.stamp_filename))
+
+    def test_successful_status_check_is_stamped(self):
+        # Arrange
+        env = self.create_env(self.create_fake_npm(0), check_status = True)
+
+        # Act
+        env.install()
+        status = env.get_status()
+
+        # Assert
+        self.assertTrue(status)
+        self.assertTrue(env.is_stamp_valid())
+
+    def test_install_called_when_package_json_changed(self):
+        # Arrange
+        self.install(self.env)
+        self.write_package_json('{"name": "test", "version": "1.0.0"}')
+
+        # Act
+        result = self.env.install()
+
+        # Assert
+        self.assertEqual(result, b'install\n')
+
+    def test_install_called_when_links_changed(self):
+        # Arrange
+        self.install(self.env)
+        self.env.linked_packages['dep'] = '/dep'
+
+        # Act
+        result = self.env.install()
+
+        # Assert
+        self.assertEqual(result, b'install\n')
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import check_call, check_output
+
+from vcp.mirror_cache import MirrorCache
+from vcp.repositories import GitRepository
+
+class TestMirrorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.remote = os.path.join(self.path, 'remote')
+        check_call(['git', 'init', '-q', self.remote])
+        self.commit()
+        self.cache = MirrorCache(os.path.join(self.path, 'mirrors'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def commit(self):
+        check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '-q', '--allow-empty', '-m', 'test'], cwd = self.remote)
+
+    def test_sync_creates_and_updates(self):
+        # Arrange
+        url = 'file://' + self.remote
+        self.cache.sync([url])
+        self.commit()
+
+        # Act
+        result = self.cache.sync([url, url])
+
+        # Assert
+        self.assertEqual(list(result.keys()), [url])
+        self.assertTrue(result[url][0])
+        self.assertTrue(self.cache.get_path(url).endswith('-remote.git'))
+        self.assertEqual(os.listdir(self.cache.path), [os.path.basename(self.cache.get_path(url))])
+
+    def test_update_keeps_the_objects(self):
+        # Arrange
+        url = 'file://' + self.remote
+        check_call(['git', 'branch', 'feature'], cwd = self.remote)
+        self.cache.sync([url])
+        check_call(['git', 'branch', '-D', 'feature'], cwd = self.remote)
+
+        # Act
+        self.cache.sync([url])
+
+        # Assert
+        path = self.cache.get_path(url)
+        self.assertEqual(check_output(['git', 'config', 'gc.auto'], cwd = path, universal_newlines = True).strip(), '0')
+        self.assertIn('refs/heads/feature', check_output(['git', 'show-ref'], cwd = path, universal_newlines = True))
+
+    def test_workspace_fetch(self):
+        # Arrange
+        url = 'file://' + self.remote
+        check_call(['git', 'branch', 'feature'], cwd = self.remote)
+        self.cache.sync([url])
+        workspace = os.path.join(self.path, 'workspace')
+        check_call(['git', 'clone', '-q', url, workspace])
+        check_call(['git', 'tag', 'local-only'], cwd = workspace)
+        check_call(['git', 'branch', '-D', 'feature'], cwd = self.remote)
+        self.commit()
+        check_call(['git', 'tag', 'v1'], cwd = self.remote)
+        repo = GitRepository(workspace, 'workspace')
+        repo.mirror_cache = self.cache
+
+        # Act
+        repo.fetch()
+
+        # Assert
+        refs = check_output(['git', 'show-ref'], cwd = workspace, universal_newlines = True)
+        self.assertIn('refs/tags/local-only', refs)
+        self.assertIn('refs/tags/v1', refs)
+        self.assertNotIn('refs/remotes/origin/feature', refs)
+        remote_head = check_output(['git', 'rev-parse', 'HEAD'], cwd = self.remote, universal_newlines = True).strip()
+        branch = check_output(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd = self.remote, universal_newlines = True).strip()
+        self.assertIn('{} refs/remotes/origin/{}'.format(remote_head, branch), refs)
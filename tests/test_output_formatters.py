@@ -0,0 +1,93 @@
+import json
+from collections import OrderedDict
+import unittest
+from io import StringIO
+
+from vcp.output_formatters import BoxFormatter, JSONFormatter, NDJSONFormatter
+from vcp.project import DiffStatTotalBox
+from vcp.repository_command_result_box import RepositoryCommandResultBox
+from vcp.repositories import GitRepository
+
+class FakeOutput(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def writeln(self, line):
+        self.lines.append(line)
+
+class FakeVCP(object):
+
+    def __init__(self):
+        self.output = FakeOutput()
+
+class TestOutputFormatters(unittest.TestCase):
+
+    def create_box(self, name):
+        repo = GitRepository('/tmp/' + name, name)
+        return RepositoryCommandResultBox(repo, "abc123 fix", 'unreleased', [dict(sha = 'abc123', subject = 'fix')], 0, 0.1)
+
+    def test_ndjson_record_per_line(self):
+        # Arrange
+        stream = StringIO()
+        formatter = NDJSONFormatter(None, stream)
+
+        # Act
+        formatter.begin()
+        formatter.write(self.create_box('repo1'))
+        formatter.write(self.create_box('repo2'))
+        formatter.end()
+
+        # Assert
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([r['repo'] for r in records], ['repo1', 'repo2'])
+        self.assertEqual(records[0]['path'], '/tmp/repo1')
+        self.assertEqual(records[0]['command'], 'unreleased')
+        self.assertEqual(records[0]['exit_status'], 0)
+        self.assertEqual(records[0]['payload'], [dict(sha = 'abc123', subject = 'fix')])
+
+    def test_json_list(self):
+        # Arrange
+        stream = StringIO()
+        formatter = JSONFormatter(None, stream)
+
+        # Act
+        formatter.begin()
+        formatter.write(self.create_box('repo1'))
+        formatter.write_data('repo2')
+        formatter.end()
+
+        # Assert
+        data = json.loads(stream.getvalue())
+        self.assertEqual(data[0]['repo'], 'repo1')
+        self.assertEqual(data[1], 'repo2')
+
+    def test_json_empty_list(self):
+        # Arrange
+        stream = StringIO()
+        formatter = JSONFormatter(None, stream)
+
+        # Act
+        formatter.begin()
+        formatter.end()
+
+        # Assert
+        self.assertEqual(json.loads(stream.getvalue()), [])
+
+    def test_box_raw_content(self):
+        # Arrange
+        vcp = FakeVCP()
+        formatter = BoxFormatter(vcp)
+        box = self.create_box('repo1')
+        box.content = "1\t2\trepo1/setup.py"
+        box.raw = True
+        total = OrderedDict([('repositories', 1), ('files', 1), ('insertions', 1), ('deletions', 2)])
+
+        # Act
+        formatter.begin()
+        formatter.write(box)
+        formatter.write(DiffStatTotalBox(total, numstat = True))
+        formatter.end()
+
+        # Assert
+        self.assertEqual(vcp.output.lines, ["1\t2\trepo1/setup.py"])
@@ -0,0 +1,41 @@
+import unittest
+from io import StringIO
+
+from vcp.output_writer import OutputWriter
+
+class TestOutputWriter(unittest.TestCase):
+
+    def test_buffered_until_flush(self):
+        # Arrange
+        stream = StringIO()
+        writer = OutputWriter(stream)
+
+        # Act
+        writer.writeln("line1")
+        before_flush = stream.getvalue()
+        writer.flush()
+
+        # Assert
+        self.assertEqual(before_flush, '')
+        self.assertEqual(stream.getvalue(), "line1\n")
+
+    def test_drain_when_buffer_is_full(self):
+        # Arrange
+        stream = StringIO()
+        writer = OutputWriter(stream, buffer_size = 10)
+
+        # Act
+        writer.write("12345")
+        writer.write("67890")
+
+        # Assert
+        self.assertEqual(stream.getvalue(), "1234567890")
+
+    def test_log_only_in_debug_mode(self):
+        # Arrange
+        writer = OutputWriter(StringIO(), debug = True)
+
+        # Act & Assert
+        with self.assertLogs('vcp.output_writer', 'DEBUG') as logs:
+            writer.write("result")
+        self.assertEqual(len(logs.records), 1)
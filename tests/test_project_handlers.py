@@ -0,0 +1,162 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from vcp.project_handler_base import ProjectHandlerFactory
+from vcp.tools import CalledProcessError
+from vcp.project_handlers import HTTPProjectHandler, GitProjectHandler, BACKGROUND_REFRESH_DEFAULT_TTL
+
+INDEX = b"""
+project1:
+  description: test
+  repositories:
+    repo1: {}
+"""
+
+ETAG = '"v1"'
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+
+    status_codes = []
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == ETAG:
+            self.status_codes.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.status_codes.append(200)
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(INDEX)))
+        self.end_headers()
+        self.wfile.write(INDEX)
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPProjectHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        IndexRequestHandler.status_codes = []
+        self.server = HTTPServer(('127.0.0.1', 0), IndexRequestHandler)
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        self.uri = 'http://127.0.0.1:{}/projects.yaml'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+
+    def create_handler(self):
+        handler = ProjectHandlerFactory().create(self.uri, self.path)
+        handler.config_init()
+        return handler
+
+    def test_factory(self):
+        # Act
+        handler = ProjectHandlerFactory().create('https://example.com/projects.yaml', self.path)
+
+        # Assert
+        self.assertIsInstance(handler, HTTPProjectHandler)
+        self.assertEqual(handler.remote_url, 'https://example.com/projects.yaml')
+
+    def test_revalidate_with_etag(self):
+        # Arrange
+        self.create_handler()
+
+        # Act
+        handler = self.create_handler()
+
+        # Assert
+        self.assertEqual(IndexRequestHandler.status_codes, [200, 304])
+        self.assertEqual(list(handler.load().keys()), ['project1'])
+
+    def test_offline_uses_cache(self):
+        # Arrange
+        self.create_handler()
+        self.server.shutdown()
+        self.server.server_close()
+
+        # Act
+        handler = self.create_handler()
+
+        # Assert
+        self.assertEqual(handler.load()['project1']['description'], 'test')
+
+class TestGitProjectHandlerBackgroundRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.handler = GitProjectHandler('/remote/configs.git', self.path, background_refresh = True)
+        self.git_dir = os.path.join(self.handler.path, '.git')
+        os.makedirs(self.git_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fetched_before(self, seconds):
+        # the fetch has been applied already
+        mtime = time.time() - seconds
+        for name in ['FETCH_HEAD', 'vcp_last_update']:
+            filename = os.path.join(self.git_dir, name)
+            open(filename, 'w').close()
+            os.utime(filename, (mtime, mtime))
+
+    def config_init(self, update = False):
+        with mock.patch('vcp.project_handlers.Popen') as popen, mock.patch('vcp.project_handlers.check_call'):
+            self.handler.config_init()
+            if update:
+                self.handler.update(force = True)
+            self.handler.close()
+        return popen
+
+    def test_no_fetch_without_ttl_if_fetched_recently(self):
+        # Arrange
+        self.fetched_before(10)
+
+        # Act
+        popen = self.config_init()
+
+        # Assert
+        popen.assert_not_called()
+
+    def test_fetch_without_ttl_after_the_default(self):
+        # Arrange
+        self.fetched_before(BACKGROUND_REFRESH_DEFAULT_TTL + 10)
+
+        # Act
+        popen = self.config_init()
+
+        # Assert
+        popen.assert_called_once()
+
+    def test_no_background_fetch_if_updated(self):
+        # Arrange
+        self.fetched_before(BACKGROUND_REFRESH_DEFAULT_TTL + 10)
+
+        # Act
+        popen = self.config_init(update = True)
+
+        # Assert
+        popen.assert_not_called()
+
+    def test_failed_apply_is_not_an_update(self):
+        # Arrange
+        self.fetched_before(BACKGROUND_REFRESH_DEFAULT_TTL + 10)
+        os.remove(os.path.join(self.git_dir, 'vcp_last_update'))
+        open(os.path.join(self.git_dir, 'FETCH_HEAD'), 'w').close()
+
+        # Act
+        with mock.patch('vcp.project_handlers.check_call', side_effect = CalledProcessError(1, 'git rebase', 'conflict')):
+            self.handler.config_init()
+
+        # Assert
+        self.assertFalse(os.path.exists(os.path.join(self.git_dir, 'vcp_last_update')))
+        self.assertTrue(os.path.exists(os.path.join(self.git_dir, 'vcp_last_apply')))
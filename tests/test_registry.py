@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from vcp.registry import SQLiteRegistry, RepositoryRegistry
+from vcp.repository import RepositoryFactory
+import vcp.repositories # NOQA (register the git repository type)
+
+class TestSQLiteRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'registry.sqlite')
+        self.repo_factory = RepositoryFactory()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_repositories(self):
+        # Arrange
+        repositories = SQLiteRegistry(self.filename).create_repositories(self.repo_factory)
+
+        # Act
+        repositories['r1'] = self.repo_factory.create('/r1', 'git', 'r1')
+        repositories.update(dict(r2 = self.repo_factory.create('/r2', 'git', 'r2')))
+        del repositories['r1']
+
+        # Assert
+        reloaded = SQLiteRegistry(self.filename).create_repositories(self.repo_factory)
+        self.assertEqual(list(reloaded), ['r2'])
+        self.assertEqual(reloaded['r2'].path, '/r2')
+        self.assertNotIn('r1', reloaded)
+        self.assertEqual(reloaded.find_by_path('/r2').name, 'r2')
+
+    def test_apply_is_atomic(self):
+        # Arrange
+        repositories = SQLiteRegistry(self.filename).create_repositories(self.repo_factory)
+        repositories.update(dict(r1 = self.repo_factory.create('/r1', 'git', 'r1'), r2 = self.repo_factory.create('/r2', 'git', 'r2')))
+        invalid = self.repo_factory.create(None, 'git', 'r3')
+
+        # Act
+        with self.assertRaises(sqlite3.IntegrityError):
+            repositories.apply(['r1', 'r2'], dict(r3 = invalid))
+
+        # Assert
+        reloaded = SQLiteRegistry(self.filename).create_repositories(self.repo_factory)
+        self.assertEqual(list(reloaded), ['r1', 'r2'])
+
+    def test_settings(self):
+        # Arrange
+        registry = SQLiteRegistry(self.filename)
+        registry.load_settings()
+
+        # Act
+        registry.save_settings(dict(default_project = 'p1', repo_groups = dict(g1 = ['r1'])))
+
+        # Assert
+        settings = SQLiteRegistry(self.filename).load_settings()
+        self.assertEqual(settings, dict(default_project = 'p1', repo_groups = dict(g1 = ['r1'])))
+
+class TestRepositoryRegistry(unittest.TestCase):
+
+    def test_repositories_are_created_on_access(self):
+        # Arrange
+        repositories = RepositoryRegistry(RepositoryFactory(), dict(r1 = ('/r1', 'git'), r2 = ('/r2', 'git')))
+
+        # Act
+        repo = repositories['r1']
+
+        # Assert
+        self.assertEqual(list(repositories.cache.keys()), ['r1'])
+        self.assertIs(repositories['r1'], repo)
+        self.assertFalse(hasattr(repo, '__dict__'))
+        self.assertEqual(repositories.get_data()['r2'], dict(path = '/r2', name = 'r2', type = 'git'))
@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import check_call, check_output
+from unittest import mock
+
+from vcp.repositories import GitRepository, parse_tag_refs, diff_tags, parse_numstat
+from vcp.project import summarize_diffstat
+from vcp.exceptions import RepositoryException
+
+class TestTagReconciliation(unittest.TestCase):
+
+    def test_parse_skips_peeled_refs(self):
+        # Arrange
+        lines = ["1111\trefs/tags/v1", "2222\trefs/tags/v2", "3333\trefs/tags/v2^{}"]
+
+        # Act
+        tags = parse_tag_refs(lines)
+
+        # Assert
+        self.assertEqual(tags, dict(v1 = '1111', v2 = '2222'))
+
+    def test_diff(self):
+        # Arrange
+        local = dict(v1 = '1111', v2 = '2222', local = '4444')
+        remote = dict(v1 = '1111', v2 = '5555', v3 = '6666')
+
+        # Act
+        to_delete, to_fetch = diff_tags(local, remote)
+
+        # Assert
+        self.assertEqual(to_delete, ['local'])
+        self.assertEqual(to_fetch, ['v2', 'v3'])
+
+class TestResetTags(unittest.TestCase):
+
+    MALICIOUS_TAG = 'v$(touch${IFS}pwned)'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.remote = os.path.join(self.path, 'remote')
+        self.local = os.path.join(self.path, 'local')
+        check_call(['git', 'init', '-q', self.remote])
+        self.git(self.remote, '-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '-q', '--allow-empty', '-m', 'test')
+        check_call(['git', 'clone', '-q', self.remote, self.local])
+        self.repo = GitRepository(self.local, 'local')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def git(self, cwd, *args):
+        return check_output(['git'] + list(args), cwd = cwd, universal_newlines = True)
+
+    def get_tags(self, cwd):
+        return sorted(self.git(cwd, 'tag').split())
+
+    def test_tag_names_are_not_interpreted_by_shell(self):
+        # Arrange
+        self.git(self.remote, 'tag', self.MALICIOUS_TAG)
+        self.git(self.local, 'tag', 'local-' + self.MALICIOUS_TAG)
+
+        # Act
+        self.repo.reset_tags()
+
+        # Assert
+        self.assertEqual(self.get_tags(self.local), [self.MALICIOUS_TAG])
+        self.assertFalse(os.path.exists(os.path.join(self.local, 'pwned')))
+
+    def test_fetch_in_batches(self):
+        # Arrange
+        tags = ['v1', 'v2', 'v3']
+        for tag in tags:
+            self.git(self.remote, 'tag', tag)
+
+        # Act
+        with mock.patch('vcp.repositories.TAG_FETCH_BATCH_SIZE', 2):
+            self.repo.reset_tags()
+
+        # Assert
+        self.assertEqual(self.get_tags(self.local), tags)
+
+class TestShallowInit(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.remote = os.path.join(self.path, 'remote')
+        check_call(['git', 'init', '-q', '-b', 'main', self.remote])
+        self.shas = []
+        for idx in range(3):
+            self.git(self.remote, '-c', 'user.name=test', '-c', 'user.email=test@test', 'commit', '-q', '--allow-empty', '-m', str(idx))
+            self.shas.append(self.git(self.remote, 'rev-parse', 'HEAD').strip())
+        self.git(self.remote, 'tag', 'v1', self.shas[1])
+        self.local = os.path.join(self.path, 'local')
+        os.mkdir(self.local)
+        self.repo = GitRepository(self.local, 'local')
+        # the depth is ignored for the local paths
+        self.url = 'file://' + self.remote
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def git(self, cwd, *args):
+        return check_output(['git'] + list(args), cwd = cwd, universal_newlines = True)
+
+    def get_head(self):
+        return self.git(self.local, 'rev-parse', 'HEAD').strip()
+
+    def test_branch(self):
+        # Act
+        self.repo.init(self.url, 'main', dict(depth = 1))
+
+        # Assert
+        self.assertEqual(self.get_head(), self.shas[2])
+        self.assertTrue(self.repo.is_shallow())
+
+    def test_tag(self):
+        # Act
+        self.repo.init(self.url, 'v1', dict(single_branch = True))
+
+        # Assert
+        self.assertEqual(self.get_head(), self.shas[1])
+
+    def test_commit(self):
+        # Act
+        self.repo.init(self.url, self.shas[0], dict(depth = 1))
+
+        # Assert
+        self.assertEqual(self.get_head(), self.shas[0])
+
+    def test_abbreviated_commit(self):
+        # Act & Assert
+        with self.assertRaises(RepositoryException):
+            self.repo.init(self.url, self.shas[0][:7], dict(depth = 1))
+
+class TestDiffStat(unittest.TestCase):
+
+    def test_parse_numstat(self):
+        # Arrange
+        lines = ["3\t1\tsetup.py", "-\t-\tlogo.png", "0\t2\tdir/with space.txt"]
+
+        # Act
+        files = parse_numstat(lines)
+
+        # Assert
+        self.assertEqual(files, [
+            dict(path = 'setup.py', insertions = 3, deletions = 1),
+            dict(path = 'logo.png', insertions = 0, deletions = 0),
+            dict(path = 'dir/with space.txt', insertions = 0, deletions = 2),
+        ])
+
+    def test_summarize(self):
+        # Arrange
+        files = parse_numstat(["3\t1\tsetup.py", "0\t2\tREADME.md"])
+
+        # Act
+        summary = summarize_diffstat(files)
+
+        # Assert
+        self.assertEqual((summary['files'], summary['insertions'], summary['deletions']), (2, 3, 3))
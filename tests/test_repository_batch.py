@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+import shutil
+import os
+
+from vcp.repository import RepositoryFactory
+from vcp.repository_batch import RepositoryBatch
+from vcp.registry import RepositoryRegistry
+from vcp.exceptions import RepositoryException
+import vcp.repositories # NOQA (register the git repository type)
+
+class FakeVCP(object):
+
+    def __init__(self):
+        self.repo_factory = RepositoryFactory()
+        self.repositories = RepositoryRegistry(self.repo_factory)
+        self.commit_index = None
+        self.save_count = 0
+
+    def save_config(self):
+        self.save_count += 1
+
+class TestRepositoryBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ['repo1', 'repo2']:
+            os.mkdir(os.path.join(self.root, name))
+        self.vcp = FakeVCP()
+        self.vcp.repositories['old'] = self.vcp.repo_factory.create(self.root, 'git', 'old')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_apply_saves_once(self):
+        # Arrange
+        batch = RepositoryBatch(self.vcp)
+        batch.add_from_text("{}\n{}\n".format(os.path.join(self.root, 'repo1'), os.path.join(self.root, 'repo2')))
+        batch.remove('old')
+
+        # Act
+        batch.apply()
+
+        # Assert
+        self.assertEqual(sorted(self.vcp.repositories.keys()), ['repo1', 'repo2'])
+        self.assertEqual(self.vcp.save_count, 1)
+
+    def test_json_input(self):
+        # Arrange
+        batch = RepositoryBatch(self.vcp)
+
+        # Act
+        batch.add_from_text('[{"path": "%s", "name": "custom"}]' % os.path.join(self.root, 'repo1'))
+        batch.apply()
+
+        # Assert
+        self.assertEqual(self.vcp.repositories['custom'].path, os.path.join(self.root, 'repo1'))
+
+    def test_reject_whole_batch(self):
+        # Arrange
+        batch = RepositoryBatch(self.vcp)
+        batch.add(os.path.join(self.root, 'repo1'))
+        batch.add(os.path.join(self.root, 'missing'))
+        batch.remove('unknown')
+
+        # Act & Assert
+        with self.assertRaises(RepositoryException):
+            batch.apply()
+        self.assertEqual(list(self.vcp.repositories.keys()), ['old'])
+        self.assertEqual(self.vcp.save_count, 0)
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from vcp.repository_scanner import RepositoryScanner
+
+class TestRepositoryScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def make_dirs(self, *paths):
+        for path in paths:
+            os.makedirs(os.path.join(self.root, path))
+
+    def write(self, path, content):
+        with open(os.path.join(self.root, path), 'w') as f:
+            f.write(content)
+
+    def test_scan(self):
+        # Arrange
+        self.make_dirs('repo1/.git', 'group/repo2/.git', 'group/repo2/sub/.git', 'worktree', 'module')
+        self.write('worktree/.git', 'gitdir: /somewhere/repo/.git/worktrees/worktree')
+        self.write('module/.git', 'gitdir: ../repo1/.git/modules/module')
+
+        # Act
+        found = RepositoryScanner(2).scan(self.root)
+
+        # Assert
+        self.assertEqual(found, [
+            (os.path.join(self.root, 'group/repo2'), 'repository'),
+            (os.path.join(self.root, 'group/repo2/sub'), 'repository'),
+            (os.path.join(self.root, 'module'), 'submodule'),
+            (os.path.join(self.root, 'repo1'), 'repository'),
+            (os.path.join(self.root, 'worktree'), 'worktree'),
+        ])
+
+    def test_submodules_are_not_descended_into(self):
+        # Arrange
+        self.make_dirs('repo/.git', 'repo/libs/lib/nested/.git', 'repo/module/nested/.git')
+        self.write('repo/.gitmodules', '[submodule "lib"]\n\tpath = libs/lib\n\turl = ../lib\n')
+        self.write('repo/module/.git', 'gitdir: ../.git/modules/module')
+
+        # Act
+        found = RepositoryScanner(2).scan(self.root)
+
+        # Assert
+        self.assertEqual(found, [
+            (os.path.join(self.root, 'repo'), 'repository'),
+            (os.path.join(self.root, 'repo/module'), 'submodule'),
+        ])
+
+    def test_pruned_dirs(self):
+        # Arrange
+        self.make_dirs('project/node_modules/pkg/.git', 'env/lib/x/.git', 'project/.venv/y/.git')
+        self.write('env/pyvenv.cfg', '')
+
+        # Act
+        found = RepositoryScanner(2).scan(self.root)
+
+        # Assert
+        self.assertEqual(found, [])
@@ -1,7 +1,7 @@
 
 import unittest
 
-from vcp.system_package_manager_handlers import SystemPackageManagerHandlerFactory
+from vcp.system_package_manager_handlers import SystemPackageManagerHandlerFactory, DPKGHandler, PacManHandler
 
 from voidpp_tools.mocks.file_system import mockfs
 
@@ -63,3 +63,35 @@ class TestSystemPackageManagerHandler(unittest.TestCase):
 
         # Assert
         self.assertIsNone(os_type)
+
+class TestPackageQueryParsers(unittest.TestCase):
+
+    def test_dpkg_query(self):
+        # Arrange
+        output = "git\tinstall ok installed\nvim\tdeinstall ok config-files\n"
+
+        # Act
+        installed = DPKGHandler.parse_dpkg_query(output)
+
+        # Assert
+        self.assertEqual(installed, set(['git']))
+
+    def test_dpkg_query_held_package(self):
+        # Arrange
+        output = "git\thold ok installed\nvim\thold ok config-files\n"
+
+        # Act
+        installed = DPKGHandler.parse_dpkg_query(output)
+
+        # Assert
+        self.assertEqual(installed, set(['git']))
+
+    def test_name_version_lines(self):
+        # Arrange
+        output = "git 2.10.0-1\nvim 8.0.0005-1\n"
+
+        # Act
+        installed = PacManHandler.parse_name_version_lines(output)
+
+        # Assert
+        self.assertEqual(installed, set(['git', 'vim']))
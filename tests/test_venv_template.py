@@ -0,0 +1,42 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from subprocess import check_output
+
+from vcp.venv_template import VenvTemplate
+
+class TestVenvTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.template = VenvTemplate(os.path.join(self.path, 'templates'), sys.executable, with_pip = False)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_clone_is_relocated(self):
+        # Arrange
+        target = os.path.join(self.path, 'env1')
+
+        # Act
+        self.template.clone(target)
+
+        # Assert
+        prefix = check_output([os.path.join(target, 'bin', 'python'), '-c', 'import sys; print(sys.prefix)'], universal_newlines = True)
+        self.assertEqual(prefix.strip(), target)
+        with open(os.path.join(target, 'bin', 'activate')) as f:
+            self.assertNotIn(self.path + os.sep + 'templates', f.read())
+
+    def test_template_is_built_once(self):
+        # Arrange
+        self.template.clone(os.path.join(self.path, 'env1'))
+        stat = os.stat(self.template.path)
+
+        # Act
+        self.template.clone(os.path.join(self.path, 'env2'))
+
+        # Assert
+        self.assertEqual(os.listdir(os.path.dirname(self.template.path)), [os.path.basename(self.template.path)])
+        self.assertEqual(os.stat(self.template.path).st_ino, stat.st_ino)
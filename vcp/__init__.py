@@ -9,12 +9,18 @@ from .box_renderer import BoxRenderer
 from .repository import RepositoryFactory
 from .repositories import GitRepository
 from .project_handler_base import ProjectHandlerFactory
-from .commands import RepositoryCommand, ProjectCommand, NPMConfigCommand, PackageCommand
+from .commands import RepositoryCommand, ProjectCommand, NPMConfigCommand, PackageCommand, LogCommand, MirrorCommand
 from .project_languages import LanguageFactory
 from .system_package_manager_handlers import SystemPackageManagerHandlerFactory
 from .tools import yaml_add_object_hook_pairs, define_singleton
 from .exceptions import SystemPackageManagerHandlerException
 from .packages import PackageFactory
+from .output_formatters import OutputFormatterFactory
+from .output_writer import OutputWriter
+from .commit_index import CommitIndex
+from .registry import SQLiteRegistry, RepositoryRegistry
+from .venv_template import VenvTemplate
+from .mirror_cache import MirrorCache
 
 logger = getLogger(__name__)
 
@@ -39,10 +45,19 @@ class _VCPConfigParser(object):
             attr(node_value, vcp)
 
 
+    def process_registry(self, config, vcp):
+        vcp.registry_config = config
+
+    def process_mirror_cache(self, config, vcp):
+        vcp.mirror_cache_config = config
+        vcp.repo_factory.mirror_cache = MirrorCache(config['path']) if config['enabled'] else None
+
     def process_repositories(self, config, vcp):
-        vcp.repositories = {}
-        for name in config:
-            vcp.repositories[name] = vcp.repo_factory.create(**config[name])
+        if vcp.sqlite_registry:
+            vcp.repositories = vcp.sqlite_registry.create_repositories(vcp.repo_factory)
+            return
+        entries = {name: (data['path'], data['type']) for name, data in config.items()}
+        vcp.repositories = RepositoryRegistry(vcp.repo_factory, entries)
 
     def process_default_project(self, config, vcp):
         vcp.default_project = config
@@ -62,7 +77,8 @@ class _VCPConfigParser(object):
             os.mkdir(prj_ref_path)
 
         vcp.project_handler_factory = ProjectHandlerFactory()
-        vcp.project_handler = vcp.project_handler_factory.create(config['uri'], prj_ref_path)
+        vcp.project_handler = vcp.project_handler_factory.create(config['uri'], prj_ref_path, ttl = config.get('ttl', 0),
+                                                                 background_refresh = config.get('background_refresh', False))
 
         if vcp.project_handler is None:
             return
@@ -77,6 +93,9 @@ class _VCPConfigParser(object):
         if not os.path.isdir(vcp.python_venv_dir):
             os.mkdir(vcp.python_venv_dir)
 
+    def process_python_interpreter(self, config, vcp):
+        vcp.python_interpreter = config
+
     # backward compatibility parser for preserve old-style projects
     def process_projects(self, config, vcp):
         vcp.repo_groups = config
@@ -90,19 +109,37 @@ class _VCPConfigParser(object):
     def process_npm_usage_config(self, config, vcp):
         vcp.npm_usage_config = config
 
+    def process_clone_strategy(self, config, vcp):
+        vcp.clone_strategy = config
+
+    def process_system_package_manager(self, config, vcp):
+        vcp.system_package_manager = config
+
+    def process_commit_index(self, config, vcp):
+        vcp.commit_index_config = config
+
 class VCP(object):
     """Config and cli handler class"""
 
-    def __init__(self, config_loader, config_file_name = CONFIG_FILE_NAME):
+    def __init__(self, config_loader, config_file_name = CONFIG_FILE_NAME, output = None):
 
         define_singleton(self, 'repo_factory', RepositoryFactory)
         define_singleton(self, 'language_factory', LanguageFactory)
         define_singleton(self, 'package_factory', PackageFactory)
+        define_singleton(self, 'output_formatter_factory', OutputFormatterFactory)
 
+        self.output = output or OutputWriter()
         self.command_names = []
+        # the project action commands use the repositories of this workspace (see project init --worktree-from)
+        self.namespace = None
         self.projects = {}
         self.project_handler_factory = None
         self.project_handler = None
+        self.__commit_index = None
+        self.sqlite_registry = None
+        self.__python_venv_template = None
+        self.__system_package_manager_handler = None
+        self.__system_package_manager_handler_created = False
 
         yaml_add_object_hook_pairs(collections.OrderedDict)
 
@@ -117,7 +154,17 @@ class VCP(object):
             ),
         )
 
-        config_defaults = dict(
+        # the registry must be processed first, because it determines where the other nodes come from
+        config_defaults = collections.OrderedDict(registry = dict(
+            backend = 'json',
+            path = '~/.vcp_registry.sqlite',
+        ))
+        config_defaults.update(
+            # must be processed before the repositories
+            mirror_cache = dict(
+                enabled = False,
+                path = '~/.vcp_mirrors',
+            ),
             default_project = None,
             repositories = {},
             output_format = dict(
@@ -130,37 +177,73 @@ class VCP(object):
             projects_reference = dict(
                 uri = 'local://default',
                 path = '~/.vcp_project_configs/',
+                # seconds, the project config storage is not updated again within this time
+                ttl = 0,
+                background_refresh = False,
             ),
             warnings = {name: d['default'] for name, d in list(self.warning_descriptors.items())},
             python_venv_dir = '~/.virtualenvs',
+            python_interpreter = 'python3',
             repo_groups = {},
             # backward compatibility node for preserve old-style projects
             projects = {},
             npm_config = {},
             npm_usage_config = {},
+            commit_index = dict(
+                enabled = False,
+                path = '~/.vcp_commit_index.sqlite',
+            ),
+            # default for the 'clone' node of the project repo configs, eg. dict(filter = 'blob:none')
+            clone_strategy = {},
+            # name of the system package manager handler, None means detect it at every run
+            system_package_manager = None,
         )
 
         self.load_configs(config_defaults, config_loader, config_file_name)
 
     @property
     def system_package_manager_handler(self):
-        if not hasattr(self, '__system_package_manager_handler'):
+        if not self.__system_package_manager_handler_created:
+            self.__system_package_manager_handler_created = True
             try:
-                self.__system_package_manager_handler = SystemPackageManagerHandlerFactory().create()
+                self.__system_package_manager_handler = SystemPackageManagerHandlerFactory().create(self.system_package_manager)
             except SystemPackageManagerHandlerException as e:
                 logger.error(e)
                 self.__system_package_manager_handler = None
         return self.__system_package_manager_handler
 
+    @property
+    def commit_index(self):
+        """The CommitIndex instance or None if the index is disabled"""
+        if not self.commit_index_config['enabled']:
+            return None
+        if self.__commit_index is None:
+            self.__commit_index = CommitIndex(self.commit_index_config['path'])
+        return self.__commit_index
+
     @property
     def python_venv_dir(self):
         return os.path.expanduser(self._python_venv_dir)
 
+    @property
+    def python_venv_template(self):
+        """The VenvTemplate of the configured interpreter, the project environments are cloned from it"""
+        if self.__python_venv_template is None:
+            base_dir = os.path.join(self.python_venv_dir, '.templates')
+            self.__python_venv_template = VenvTemplate(base_dir, self.python_interpreter)
+        return self.__python_venv_template
+
     def load_configs(self, defaults, config_loader, config_file_name):
         self.config_loader = config_loader
         self.config = self.config_loader.load(config_file_name)
         logger.debug("Config loaded successfully from '%s'" % self.config_loader.filename)
 
+        registry_config = self.config.get('registry', defaults['registry'])
+        if registry_config['backend'] == 'sqlite':
+            self.sqlite_registry = SQLiteRegistry(registry_config['path'])
+            self.config.update(self.sqlite_registry.load_settings())
+            logger.debug("Settings loaded from '%s'" % self.sqlite_registry.path)
+
         parser = _VCPConfigParser()
         parser.parse(self.config, self, defaults)
 
@@ -168,6 +251,10 @@ class VCP(object):
 
         logger.debug("Config parsed. Projects: %d, repositories %d." % (len(self.projects), len(self.repositories)))
 
+    def get_repository_name(self, project_name, namespace = None):
+        """The name of the repository of the project in the namespace (see project init --worktree-from)"""
+        return project_name if namespace is None else '{}/{}'.format(namespace, project_name)
+
     def action_commands_lookup(self, project_related_commands):
         self.command_names = [command['name'] for command in project_related_commands]
 
@@ -177,15 +264,25 @@ class VCP(object):
             raise KeyError(attr_name)
 
         def action(name, **kwargs):
-            list = kwargs['list']
-            del kwargs['list']
+            list = kwargs.pop('list')
+            output = kwargs.pop('output')
+            self.namespace = kwargs.pop('namespace')
             project = self.projects[name]
+            results = getattr(project, attr_name)(**kwargs)
             if list:
-                logger.info(','.join([box.repository.name for box in getattr(project, attr_name)(**kwargs)]))
-            else:
-                for box in getattr(project, attr_name)(**kwargs):
-                    box.reconfig(self.output_format['header'])
-                    logger.info(self.box_renderer.render(box))
+                names = collections.OrderedDict((box.repository.name, True) for box in results if hasattr(box, 'repository'))
+                results = [name for name in names]
+                if output == 'box':
+                    self.output.writeln(','.join(results))
+                    return
+            formatter = self.output_formatter_factory.create(output, self)
+            formatter.begin()
+            for box in results:
+                if list:
+                    formatter.write_data(box)
+                else:
+                    formatter.write(box)
+            formatter.end()
 
         return action
 
@@ -193,7 +290,7 @@ class VCP(object):
         return NPMConfigCommand(self)
 
     def version(self):
-        logger.info(pkg_resources.get_distribution("vcp").version)
+        self.output.writeln(pkg_resources.get_distribution("vcp").version)
 
     def warning(self, action, message):
         self.warnings[message] = True if action == 'enable' else False
@@ -205,26 +302,75 @@ class VCP(object):
         self.save_config()
         logger.info("Python virtualenv directory has been saved")
 
+    def pyinterpreter(self, interpreter):
+        self.python_interpreter = interpreter
+        self.save_config()
+        logger.info("Python interpreter has been saved")
+
     def repository(self):
         return RepositoryCommand(self)
 
     def project(self):
         return ProjectCommand(self)
 
+    def registry(self, backend, path = None):
+        registry_config = dict(self.registry_config)
+        if path is not None:
+            registry_config['path'] = path
+
+        if backend == registry_config['backend'] and path is None:
+            logger.info("The registry backend is '{}' already".format(backend))
+            return
+
+        registry_config['backend'] = backend
+        data = self.get_data()
+        data['registry'] = registry_config
+
+        if backend == 'sqlite':
+            registry = SQLiteRegistry(registry_config['path'])
+            repositories = registry.create_repositories(self.repo_factory)
+            repositories.clear()
+            repositories.set_entries(self.repositories.iter_entries())
+            registry.load_settings()
+            registry.save_settings(self.get_settings())
+            # only the registry node remains in the config file
+            data = dict(registry = registry_config)
+
+        self.config_loader.save(data)
+        logger.info("Repositories and settings moved to the '{}' backend".format(backend))
+
     def get_data(self):
+        data = self.get_settings()
+        data.update(
+            registry = self.registry_config,
+            repositories = self.repositories.get_data(),
+        )
+        return data
+
+    def get_settings(self):
+        """The config data without the repositories and the registry nodes"""
         return dict(
             projects_reference = self.projects_reference,
-            repositories = self.repositories,
             default_project = self.default_project,
             output_format = self.output_format,
             warnings = self.warnings,
             python_venv_dir = self._python_venv_dir,
+            python_interpreter = self.python_interpreter,
             repo_groups = self.repo_groups,
             npm_config = self.npm_config,
             npm_usage_config = self.npm_usage_config,
+            commit_index = self.commit_index_config,
+            clone_strategy = self.clone_strategy,
+            mirror_cache = self.mirror_cache_config,
+            system_package_manager = self.system_package_manager,
         )
 
     def save_config(self):
+        if self.sqlite_registry:
+            # the repositories are saved immediately by the SQLiteRepositoryRegistry
+            self.sqlite_registry.save_settings(self.get_settings())
+            logger.debug("VCP settings saved to '%s'" % self.sqlite_registry.path)
+            return
         self.config_loader.save(self.get_data())
         logger.debug("VCP config saved to '%s'" % self.config_loader.filename)
 
@@ -235,12 +381,21 @@ class VCP(object):
     def package(self):
         return PackageCommand(self)
 
+    def log(self):
+        return LogCommand(self)
+
+    def mirror(self):
+        return MirrorCommand(self)
+
     def get_cli_config(self, default_project):
 
         # initialize cli tree
         project_names = list(self.projects.keys())
-        repository_names = list(self.repositories.keys())
+        # the mapping itself is used as choices: the 'in' check is a lookup, not a scan of all the names
+        repository_names = self.repositories
         package_lang_names = list(self.package_factory.types.keys())
+        output_formatter_names = sorted(self.output_formatter_factory.types.keys())
+        output_param = dict(arg_name = '--output', help = 'Output format', choices = output_formatter_names, default = 'box')
 
         # NOTE: project name parameter added later!
         project_action_commands = [
@@ -284,6 +439,13 @@ class VCP(object):
             dict(
                 name = 'diff',
                 desc = dict(help = 'Show diff in all repositories'),
+                arguments = [
+                    dict(arg_name = '--stat', help = 'show only the changed files and the totals per repository and for the project', action = 'store_true'),
+                    dict(arg_name = '--numstat', help = 'same as --stat, in the machine readable format of git diff --numstat', action = 'store_true'),
+                    dict(arg_name = '--repo', help = 'show the full diff only for this repository (can be repeated)', action = 'append',
+                         choices = repository_names, metavar = 'REPO'),
+                    dict(arg_name = '--path', help = 'show the full diff only for this path inside the repositories (can be repeated)', action = 'append'),
+                ]
             ),
             dict(
                 name = 'reset',
@@ -303,6 +465,8 @@ class VCP(object):
                         type = str,
                         default = '24h',
                     ),
+                    dict(arg_name = '--merge', help = 'merge the commits of all repositories into one time ordered stream', action = 'store_true'),
+                    dict(arg_name = '--by-day', help = 'merge the commits and group them by day', action = 'store_true'),
                 ]
             ),
         ]
@@ -319,6 +483,9 @@ class VCP(object):
                             dict(arg_name = 'name', help = 'project name', choices = project_names),
                             dict(arg_name = '--path', help = 'the base path of the repos (default: current)', default = os.getcwd()),
                             dict(arg_name = '--force', help = 'git pull --rebase and reinit lang pkg', action = 'store_true', default = False),
+                            dict(arg_name = '--retries', help = 'max number of the retries of the failed projects (default: 5)', type = int, default = 5),
+                            dict(arg_name = '--worktree-from', help = 'create the repositories as git worktrees of the checkouts in this base path', default = None),
+                            dict(arg_name = '--namespace', help = 'the worktrees are registered as <namespace>/<project> (default: the basename of the path)', default = None),
                         ]
                     ),
                     dict(
@@ -327,6 +494,7 @@ class VCP(object):
                         arguments = [
                             dict(arg_name = 'name', help = 'project name', choices = project_names),
                             dict(arg_name = '--path', help = 'the base path of the repos (default: current)', default = os.getcwd()),
+                            dict(arg_name = '--namespace', help = 'update the worktrees of this namespace (see init --worktree-from)', default = None),
                         ]
                     ),
                     dict(
@@ -362,6 +530,9 @@ class VCP(object):
                     dict(
                         name = 'list',
                         desc = dict(help = 'List of projects'),
+                        arguments = [
+                            dict(output_param),
+                        ]
                     ),
                     dict(
                         name = 'default',
@@ -375,6 +546,7 @@ class VCP(object):
                         desc = dict(help = "Set project for default and set all the dependant project's ref according to this project config."),
                         arguments = [
                             dict(arg_name = 'name', help = 'project name', choices = project_names),
+                            dict(arg_name = '--namespace', help = 'set the refs of the worktrees of this namespace (see init --worktree-from)', default = None),
                         ]
                     ),
                     dict(
@@ -385,7 +557,7 @@ class VCP(object):
                                 name = 'uri',
                                 desc = dict(help = "Set the projects config storage uri"),
                                 arguments = [
-                                    dict(arg_name = 'value', type = str),
+                                    dict(arg_name = 'value', type = str, help = "schema://url, schemas: local, git, http, https"),
                                 ]
                             ),
                             dict(
@@ -398,7 +570,9 @@ class VCP(object):
                             dict(
                                 name = 'update',
                                 desc = dict(help = "Update the project config storage"),
-                                arguments = []
+                                arguments = [
+                                    dict(arg_name = '--force', help = 'update even if it is fresh (see projects_reference.ttl)', action = 'store_true', default = False),
+                                ]
                             ),
                         ]
                     ),
@@ -433,19 +607,35 @@ class VCP(object):
                             dict(arg_name = '--add-to', help = 'add to projects', choices = project_names, nargs = '*'),
                         ]
                     ),
+                    dict(
+                        name = 'scan',
+                        desc = dict(help = 'Search git repositories and worktrees in a directory tree and register all of them'),
+                        arguments = [
+                            dict(arg_name = 'root', help = 'the root of the directory tree'),
+                            dict(arg_name = '--add-to', help = 'add to projects', choices = project_names, nargs = '*'),
+                            dict(arg_name = '--workers', help = 'number of scanner threads', type = int, default = 16),
+                        ]
+                    ),
                     dict(
                         name = 'cmd',
                         desc = dict(help = 'Execute a command on a repository'),
                         arguments = [
-                            dict(arg_name = 'name', help = 'repository name', choices = repository_names),
+                            dict(arg_name = 'name', help = 'repository name', choices = repository_names, metavar = 'name'),
                             dict(arg_name = 'command', help = 'command and params'),
                         ]
                     ),
                     dict(
                         name = 'remove',
-                        desc = dict(help = 'Remove repository'),
+                        desc = dict(help = 'Remove repositories'),
                         arguments = [
-                            dict(arg_name = 'name', help = 'repository name', choices = repository_names),
+                            dict(arg_name = 'names', help = 'repository names', choices = repository_names, nargs = '+', metavar = 'name'),
+                        ]
+                    ),
+                    dict(
+                        name = 'import',
+                        desc = dict(help = 'Register many repositories at once. All or nothing: if any of them is invalid, none of them are registered'),
+                        arguments = [
+                            dict(arg_name = 'file', help = "json (as the 'repository list --output json' output), ndjson or a path per line. Use '-' for stdin"),
                         ]
                     ),
                     dict(
@@ -453,13 +643,14 @@ class VCP(object):
                         desc = dict(help = 'List of repositories'),
                         arguments = [
                             dict(arg_name = '--format', help = 'Output format', choices = ['table', 'lines'], default = 'table'),
+                            dict(output_param, help = 'Output format (json and ndjson override the --format)'),
                         ]
                     ),
                     dict(
                         name = 'show_path',
                         desc = dict(help = 'Show path repository'),
                         arguments = [
-                            dict(arg_name = 'name', help = 'repository name', choices = repository_names),
+                            dict(arg_name = 'name', help = 'repository name', choices = repository_names, metavar = 'name'),
                         ],
                     ),
                     dict(
@@ -471,6 +662,52 @@ class VCP(object):
                     ),
                 ]
             ),
+            dict(
+                name = 'log',
+                desc = dict(help = 'Commit index of all the repositories'),
+                subcommands = [
+                    dict(
+                        name = 'search',
+                        desc = dict(help = 'Search in the commit messages of all the repositories'),
+                        arguments = [
+                            dict(arg_name = 'text', help = 'text to search'),
+                            dict(arg_name = '--limit', help = 'max number of commits', type = int, default = 100),
+                            dict(output_param),
+                        ]
+                    ),
+                    dict(
+                        name = 'update',
+                        desc = dict(help = 'Index the new commits of all the repositories'),
+                    ),
+                    dict(
+                        name = 'index',
+                        desc = dict(help = 'Enable/disable the commit index (news, unreleased, standup and pushables use it when enabled)'),
+                        arguments = [
+                            dict(arg_name = 'action', help = 'action', choices = ['enable', 'disable']),
+                        ]
+                    ),
+                ]
+            ),
+            dict(
+                name = 'mirror',
+                desc = dict(help = 'Local bare mirrors of the remote repositories, shared by all the workspaces'),
+                subcommands = [
+                    dict(
+                        name = 'sync',
+                        desc = dict(help = 'Create or update the mirrors of all the project repositories'),
+                        arguments = [
+                            dict(arg_name = '--workers', help = 'number of the parallel updates', type = int, default = 8),
+                        ]
+                    ),
+                    dict(
+                        name = 'use',
+                        desc = dict(help = 'Enable/disable the usage of the mirrors in the clones and the fetches'),
+                        arguments = [
+                            dict(arg_name = 'action', help = 'action', choices = ['enable', 'disable']),
+                        ]
+                    ),
+                ]
+            ),
             dict(
                 name = 'version',
                 desc = dict(help = 'Show VCP version'),
@@ -483,6 +720,14 @@ class VCP(object):
                     dict(arg_name = 'message', help = 'message', choices = list(self.warning_descriptors.keys())),
                 ],
             ),
+            dict(
+                name = 'registry',
+                desc = dict(help = 'Set the storage of the repositories and the settings. The data is moved to the new backend'),
+                arguments = [
+                    dict(arg_name = 'backend', help = 'sqlite: indexed storage for many repositories', choices = ['json', 'sqlite']),
+                    dict(arg_name = '--path', help = 'the sqlite database path', default = None),
+                ],
+            ),
             dict(
                 name = 'pyvenvdir',
                 desc = dict(help = 'Set the python virtualenv container directory'),
@@ -490,6 +735,13 @@ class VCP(object):
                     dict(arg_name = 'dir', help = 'path'),
                 ],
             ),
+            dict(
+                name = 'pyinterpreter',
+                desc = dict(help = 'Set the python interpreter of the new project virtualenvs'),
+                arguments = [
+                    dict(arg_name = 'interpreter', help = "name or path, eg. 'python3.6'"),
+                ],
+            ),
             dict(
                 name = 'npmconfig',
                 desc = dict(help = 'Manage npm config (for npm related commands)'),
@@ -512,6 +764,9 @@ class VCP(object):
                     dict(
                         name = 'list',
                         desc = dict(help = 'Show all configured value'),
+                        arguments = [
+                            dict(output_param),
+                        ]
                     ),
                 ]
             ),
@@ -533,6 +788,14 @@ class VCP(object):
                             dict(arg_name = 'language', help = 'language', choices = package_lang_names, nargs = '?', default = None),
                         ],
                     ),
+                    dict(
+                        name = 'system-manager',
+                        desc = dict(help = 'Show or set the system package manager. Without name it shows the current one'),
+                        arguments = [
+                            dict(arg_name = 'name', help = "'detect': save the detected one, 'auto': detect at every run",
+                                 choices = sorted(SystemPackageManagerHandlerFactory.types.keys()) + ['detect', 'auto'], nargs = '?', default = None),
+                        ],
+                    ),
                 ],
             )
         ]
@@ -545,6 +808,8 @@ class VCP(object):
                 command['arguments'] = []
             command['arguments'].insert(0, project_param)
             command['arguments'].append(dict(arg_name = '--list', help = 'Print only repo names', action = 'store_true'))
+            command['arguments'].append(dict(arg_name = '--namespace', help = 'use the worktrees of this namespace (see project init --worktree-from)', default = None))
+            command['arguments'].append(dict(output_param))
 
         self.action_commands_lookup(project_action_commands)
 
@@ -1,8 +1,19 @@
+from collections import OrderedDict
 
 class Box(object):
+    # the content is written as is, without the frame and the caption (eg. machine readable lines)
+    raw = False
+
     def __init__(self, caption, content):
         self.caption = caption
         self.content = content
 
     def reconfig(self, data):
         pass
+
+    @property
+    def data(self):
+        return OrderedDict([
+            ('caption', self.caption),
+            ('content', self.content),
+        ])
@@ -1,20 +1,32 @@
 
+import sys
+import time
 import logging
 import tempfile
 import yaml
 import os
 import shutil
 from functools import wraps
+from collections import OrderedDict
 from subprocess import check_call, CalledProcessError
 from prettytable import PrettyTable
 
 
-from .project import Project
-from .exceptions import RepositoryException, ProjectException
+from .project import Project, parse_oneline_commits
+from .repository_command_result_box import RepositoryCommandResultBox
+from .commit_index import oneline
+from .repository_scanner import RepositoryScanner
+from .repository_batch import RepositoryBatch
+from .mirror_cache import MirrorCache
+from .exceptions import RepositoryException, ProjectException, SystemPackageManagerHandlerException
+from .system_package_manager_handlers import SystemPackageManagerHandlerFactory
 from .tools import confirm, confirm_prompt
 
 logger = logging.getLogger(__name__)
 
+# seconds, the first delay before the retry of the failed project inits
+RETRY_BACKOFF = 2
+
 
 def post_process(func):
     """Calls the project handler same named function
@@ -63,14 +75,22 @@ class ProjectConfigCommand(object):
         self.vcp.projects_reference['path'] = value
         self.vcp.save_config()
 
-    def update(self):
-        self.vcp.project_handler.update()
+    def update(self, force = False):
+        self.vcp.project_handler.update(force)
 
 class ProjectCommand(object):
     def __init__(self, vcp):
         self.vcp = vcp
 
-    def __init(self, project, path, force, init_languages):
+    def __init(self, projects, root, path, force, init_languages):
+        """Initialize the projects in the given order (the dependencies first)
+
+        The projects which depend on a failed one are not initialized, they are failed too.
+
+        Returns:
+            tuple: the names of the failed projects and the names of the permanently failed ones (see
+                Project.init_failure_transient), the rest of the failed ones are worth to try again
+        """
         status = {}
         """
         REFACTOR status to project init result ENUM
@@ -79,22 +99,88 @@ class ProjectCommand(object):
         erre valo jelenleg a status. ez rossz
         """
 
-        project.init(path, status, force, init_languages = init_languages)
+        failed = set()
+        permanent = set()
+        all_deps = root.get_sorted_dependencies()
+
+        for project in projects:
+            if len(failed & set(project.get_dependent_projects())):
+                logger.info("Skip '%s', because its dependencies are failed", project.name)
+                failed.add(project.name)
+                continue
+
+            if project is root:
+                res = project.init(path, status, force, install_deps = False, init_languages = init_languages)
+            else:
+                ref = root.dependencies.get(project.name) or root.search_for_ref_in_deps(project.name, all_deps)
+                res = project.init(path, status, force, install_deps = False, init_languages = init_languages, ref = ref)
+
+            if not res or status.get(project.name) is False:
+                failed.add(project.name)
+                if res or not project.init_failure_transient:
+                    permanent.add(project.name)
 
-        failed = []
-        for name, val in list(status.items()):
-            if val is False and name not in failed:
-                failed.append(name)
+        return failed, permanent
 
-        return failed
+    def __init_worktrees(self, root, path, source_path, namespace):
+        """Create the repositories of the project tree as worktrees of the checkouts in the source path
+
+        The new repositories are registered as <namespace>/<project name>, the project action commands, workon and
+        update use them with the --namespace option. The languages are not initialized. If any of the worktrees cannot be created, the
+        already created ones are removed and nothing is registered.
+        """
+        if namespace is None:
+            namespace = os.path.basename(os.path.abspath(path).rstrip(os.sep))
+
+        all_deps = root.get_sorted_dependencies()
+        projects = list(reversed(all_deps)) + [root]
+
+        worktrees = []
+        for project in projects:
+            source = self.vcp.repositories.find_by_path(os.path.abspath(os.path.join(source_path, project.name)))
+            if source is None:
+                raise ProjectException("Repository of '{}' is not found in '{}'".format(project.name, source_path))
+            repo_name = self.vcp.get_repository_name(project.name, namespace)
+            if repo_name in self.vcp.repositories:
+                raise ProjectException("Repository '{}' is already exists".format(repo_name))
+            if project is root:
+                ref = source.cmd("git rev-parse --abbrev-ref HEAD").strip()
+            else:
+                ref = root.dependencies.get(project.name) or root.search_for_ref_in_deps(project.name, all_deps)
+            worktrees.append((project, source, repo_name, ref))
+
+        created = OrderedDict()
+        try:
+            for project, source, repo_name, ref in worktrees:
+                repo_path = os.path.abspath(os.path.join(path, project.name))
+                logger.info("Create worktree '{}' from '{}' at '{}'".format(repo_path, source.path, ref))
+                source.add_worktree(repo_path, ref)
+                created[repo_name] = (source, self.vcp.repo_factory.create(repo_path, source.type, repo_name))
+
+            self.vcp.repositories.update(OrderedDict([(name, repo) for name, (source, repo) in created.items()]))
+            self.vcp.save_config()
+        except (Exception, KeyboardInterrupt):
+            logger.error("Cannot create the worktrees, remove the already created ones")
+            self.vcp.repositories.apply([name for name in created if name in self.vcp.repositories], {})
+            for source, repo in created.values():
+                source.remove_worktree(repo.path)
+            raise
+
+        logger.info("{} worktrees created in '{}'. The languages are not initialized. Use them with '--namespace {}'.".format(
+            len(worktrees), path, namespace))
+
+    def __get_retry_nodes(self, projects, failed, permanent):
+        """The failed projects which neither failed permanently nor depend on a permanently failed one"""
+        return [p for p in projects
+                if p.name in failed and p.name not in permanent and not len(permanent & set(p.get_dependent_projects()))]
 
     def __search_sub_path_in_repos(self, path):
         search = os.path.realpath(path) + os.sep
-        for name, repo in list(self.vcp.repositories.items()):
-            repo_path = os.path.realpath(repo.path) + os.sep
+        for name, path, type in self.vcp.repositories.iter_entries():
+            repo_path = os.path.realpath(path) + os.sep
             if search.startswith(repo_path):
                 print(repo_path, search)
-                return repo
+                return self.vcp.repositories[name]
         return None
 
     def __confirm_init_path(self, path):
@@ -146,51 +232,84 @@ class ProjectCommand(object):
 
         return True
 
-    def init(self, name, path, force = False, init_languages = True):
+    def init(self, name, path, force = False, init_languages = True, retries = 5, worktree_from = None, namespace = None):
         if not self.__confirm_init_path(path):
             return
 
         project = self.vcp.projects[name]
-        tries = 5
 
-        for i in range(tries):
+        if worktree_from is not None:
+            self.__init_worktrees(project, path, worktree_from, namespace)
+            return
+
+        if project.initialized and not force:
+            logger.info("Project '%s' has been initialized already", name)
+            return
+
+        projects = list(reversed(project.get_sorted_dependencies())) + [project]
 
-            failed = self.__init(project, path, force, init_languages)
+        failed, permanent = self.__init(projects, project, path, force, init_languages)
 
-            if not len(failed):
+        for i in range(retries):
+            # the permanent errors (eg. unknown ref, missing system packages) would fail again, so only the
+            # transient ones (eg. network errors) are tried again, waiting more and more
+            nodes = self.__get_retry_nodes(projects, failed, permanent)
+            if not len(nodes):
                 break
 
-            logger.error("In {} projects the init was not successfull ({}). Try again! ({}/{})".format(len(failed), ', '.join(failed), i+1,tries))
+            delay = RETRY_BACKOFF * 2 ** i
+
+            logger.error("In {} projects the init was not successfull ({}). Try again {} projects in {} seconds! ({}/{})".format(
+                len(failed), ', '.join(sorted(failed)), len(nodes), delay, i + 1, retries))
 
-            if i+1 == tries:
-                logger.error("No more attempt...")
+            time.sleep(delay)
 
-            force = True
+            retry_failed, retry_permanent = self.__init(nodes, project, path, True, init_languages)
+            failed = (failed - set([p.name for p in nodes])) | retry_failed
+            permanent |= retry_permanent
+
+        if len(failed):
+            logger.error("No more attempt, failed projects: {}".format(', '.join(sorted(failed))))
 
         self.vcp.save_config()
 
-    def update(self, name, path):
+    def update(self, name, path, namespace = None):
         self.vcp.project_handler.update()
-        self.init(name, path, force = True, init_languages = True)
+        self.vcp.namespace = namespace
+
+        project = self.vcp.projects[name]
+        status = {}
+        if not project.update(path, status):
+            logger.error("Update of the project '{}' has been failed".format(name))
+
+        failed = [name for name, val in status.items() if val is False]
+        if len(failed):
+            logger.error("In {} projects the update was not successfull: {}".format(len(failed), ', '.join(failed)))
+
+        self.vcp.save_config()
 
     def config(self):
         return ProjectConfigCommand(self.vcp)
 
-    def workon(self, name):
+    def workon(self, name, namespace = None):
         self.__default(name)
+        self.vcp.namespace = namespace
         prj = self.vcp.projects[name]
         prj.set_dependencies_state()
         self.vcp.save_config()
 
     def show(self, name):
         prj = self.vcp.projects[name]
-        logger.info(yaml.dump(prj.data, default_flow_style = False))
+        self.vcp.output.write(yaml.dump(prj.data, default_flow_style = False))
 
     @post_process
     def remove(self, name, **kwargs):
         # TODO: check other projects dependencies
         del self.vcp.projects[name]
-        os.remove(self.vcp.project_handler.get_project_config_path(name))
+        config_path = self.vcp.project_handler.get_project_config_path(name)
+        # the read only storages (eg. http) have no file per project
+        if os.path.isfile(config_path):
+            os.remove(config_path)
         logger.info("Project removed")
         self.vcp.save_project_config()
 
@@ -220,11 +339,23 @@ class ProjectCommand(object):
             self.vcp.save_project_config()
         return res
 
-    def list(self):
+    def list(self, output = 'box'):
+        projects = list(self.vcp.projects.values())
+
+        if output != 'box':
+            formatter = self.vcp.output_formatter_factory.create(output, self.vcp)
+            formatter.begin()
+            for project in sorted(projects, key = lambda p: p.name):
+                data = OrderedDict([('name', project.name)])
+                data.update(project.data)
+                data['initialized'] = project.initialized
+                formatter.write_data(data)
+            formatter.end()
+            return
+
         table = PrettyTable(["Name", "Description", "Deps", "Languages", "Initialized"])
         table.align = 'l'
         table.align["Deps"] = "r"
-        projects = list(self.vcp.projects.values())
         for project in sorted(projects, key = lambda p: p.name):
             table.add_row([
                 project.name,
@@ -234,7 +365,7 @@ class ProjectCommand(object):
                 project.initialized,
             ])
 
-        logger.info("Known projects ({}):\n{}".format(len(projects), table))
+        self.vcp.output.writeln("Known projects ({}):\n{}".format(len(projects), table))
 
     def default(self, name):
         self.__default(name)
@@ -270,46 +401,72 @@ class NPMConfigCommand(object):
         self.vcp.save_config()
         logger.info("Npm config saved")
 
-    def list(self):
+    def list(self, output = 'box'):
+        if output != 'box':
+            formatter = self.vcp.output_formatter_factory.create(output, self.vcp)
+            formatter.begin()
+            for name in sorted(self.vcp.npm_config.keys()):
+                formatter.write_data(dict(name = name, value = self.vcp.npm_config[name]))
+            formatter.end()
+            return
+
         if not len(self.vcp.npm_config):
-            logger.info("Empty")
+            self.vcp.output.writeln("Empty")
 
         table = PrettyTable(["Name", "Value"])
         for name in sorted(self.vcp.npm_config.keys()):
             table.add_row([name, self.vcp.npm_config[name]])
-        logger.info("NPM config:\n{}".format(table))
+        self.vcp.output.writeln("NPM config:\n{}".format(table))
 
 class RepositoryCommand(object):
     def __init__(self, vcp):
         self.vcp = vcp
 
     def cmd(self, name, command):
-        logger.info(self.vcp.repositories[name].cmd(command))
+        self.vcp.output.write(self.vcp.repositories[name].cmd(command))
 
     def show_path(self, name):
-        print((self.vcp.repositories[name].path))
-
-    def list(self, format):
-        # TODO: refactor this output format to sg generic, which appliable to the whole vcp
-        if format == 'table':
+        self.vcp.output.writeln(self.vcp.repositories[name].path)
+
+    def list(self, format, output = 'box'):
+        if output != 'box':
+            formatter = self.vcp.output_formatter_factory.create(output, self.vcp)
+            formatter.begin()
+            for name, path, type in self.vcp.repositories.iter_entries():
+                formatter.write_data(dict(path = path, name = name, type = type))
+            formatter.end()
+        elif format == 'table':
             table = PrettyTable(["Type", "Name", "Path"])
             table.align = 'l'
-            for repo_name in sorted(self.vcp.repositories):
-                repo = self.vcp.repositories[repo_name]
-                table.add_row([repo.type, repo.name, repo.path])
-            logger.info("Known repositories:\n{}".format(table))
+            for name, path, type in self.vcp.repositories.iter_entries():
+                table.add_row([type, name, path])
+            self.vcp.output.writeln("Known repositories:\n{}".format(table))
+        else:
+            # this format use for bash tab completion
+            self.vcp.output.writeln('\n'.join(self.vcp.repositories))
+
+    def remove(self, names):
+        batch = RepositoryBatch(self.vcp)
+        for name in names:
+            batch.remove(name)
+        batch.apply()
+        logger.info("Repository removed: {}".format(', '.join(names)))
+
+    def import_(self, file):
+        if file == '-':
+            text = sys.stdin.read()
         else:
-            # logger prints color codes, but this format use for bash tab completion
-            print(('\n'.join(sorted(self.vcp.repositories.keys()))))
+            with open(file) as f:
+                text = f.read()
 
-    def remove(self, name):
-        del self.vcp.repositories[name]
-        logger.info("Repository '{}' removed".format(name))
-        self.vcp.save_config()
+        batch = RepositoryBatch(self.vcp)
+        batch.add_from_text(text)
+        batch.apply()
+        logger.info("{} repositories imported".format(len(batch.additions)))
 
     @confirm()
     def clear(self, iamsure):
-        self.vcp.repositories = {}
+        self.vcp.repositories.clear()
         self.vcp.save_config()
         logger.info("Repositories has been removed.")
 
@@ -328,14 +485,126 @@ class RepositoryCommand(object):
         msg = "Repository '%s' created" % name
 
         if add_to is not None:
-            add_to = set(add_to)
-            for prj_name in add_to:
-                self.vcp.projects[prj_name].repositories.append(name)
-            msg += " and added to project: " + ', '.join(add_to)
+            self.__add_to_projects([name], add_to)
+            msg += " and added to project: " + ', '.join(set(add_to))
 
         logger.info(msg)
         self.vcp.save_config()
 
+    def __add_to_projects(self, names, add_to):
+        for prj_name in set(add_to):
+            self.vcp.projects[prj_name].repositories.extend(names)
+
+    def __get_unique_name(self, root, path):
+        """The basename of the path, or the path relative to the root if the basename is used already"""
+        name = os.path.basename(path)
+        if name not in self.vcp.repositories:
+            return name
+        base_name = os.path.relpath(path, os.path.abspath(root)).replace(os.sep, '/')
+        if base_name == '.':
+            base_name = name
+        name = base_name
+        idx = 1
+        while name in self.vcp.repositories:
+            idx += 1
+            name = "{}-{}".format(base_name, idx)
+        logger.info("Repository name '%s' is already used, '%s' is registered as '%s'", os.path.basename(path), path, name)
+        return name
+
+    def scan(self, root, add_to = None, workers = 16):
+        if not os.path.isdir(root):
+            raise RepositoryException("Path '%s' is not exists" % root)
+
+        found = RepositoryScanner(workers).scan(root)
+
+        known_paths = set([os.path.realpath(path) for name, path, type in self.vcp.repositories.iter_entries()])
+        created = []
+
+        # the shallower repositories get the basenames first
+        for path, type in sorted(found, key = lambda item: (item[0].count(os.sep), item[0])):
+            if type == 'submodule':
+                logger.debug("Skip submodule '%s'", path)
+                continue
+            if os.path.realpath(path) in known_paths:
+                logger.debug("Repository '%s' is already registered", path)
+                continue
+            name = self.__get_unique_name(root, path)
+            self.vcp.repositories[name] = self.vcp.repo_factory.create(path, 'git', name)
+            created.append(name)
+
+        msg = "Found {} repositories, {} new registered".format(len(found), len(created))
+
+        if len(created) and add_to is not None:
+            self.__add_to_projects(created, add_to)
+            msg += " and added to project: " + ', '.join(set(add_to))
+
+        logger.info(msg)
+
+        if len(created):
+            self.vcp.save_config()
+
+class LogCommand(object):
+    def __init__(self, vcp):
+        self.vcp = vcp
+
+    def __check_index(self):
+        if self.vcp.commit_index is None:
+            logger.error("The commit index is disabled. Enable it with 'vcp log index enable'")
+            return False
+        return True
+
+    def index(self, action):
+        self.vcp.commit_index_config['enabled'] = action == 'enable'
+        self.vcp.save_config()
+        logger.info("Commit index {}d".format(action))
+
+    def update(self):
+        if not self.__check_index():
+            return
+        for name in sorted(self.vcp.repositories):
+            count = self.vcp.commit_index.update(self.vcp.repositories[name])
+            logger.info("{}: {} new commits".format(name, count))
+
+    def search(self, text, limit, output):
+        if not self.__check_index():
+            return
+
+        results = OrderedDict()
+        for repo_name, sha, time, subject in self.vcp.commit_index.search(text, limit):
+            if repo_name not in self.vcp.repositories:
+                continue
+            results.setdefault(repo_name, []).append(oneline(sha, subject))
+
+        formatter = self.vcp.output_formatter_factory.create(output, self.vcp)
+        formatter.begin()
+        for repo_name, commits in results.items():
+            repo = self.vcp.repositories[repo_name]
+            formatter.write(RepositoryCommandResultBox(repo, "\n".join(commits), 'search', parse_oneline_commits(commits)))
+        formatter.end()
+
+class MirrorCommand(object):
+    def __init__(self, vcp):
+        self.vcp = vcp
+
+    def use(self, action):
+        self.vcp.mirror_cache_config['enabled'] = action == 'enable'
+        self.vcp.save_config()
+        logger.info("Mirror usage {}d".format(action))
+
+    def sync(self, workers):
+        mirror_cache = MirrorCache(self.vcp.mirror_cache_config['path'])
+        urls = [project.repo['url'] for project in self.vcp.projects.values() if project.repo.get('url')]
+
+        failed = 0
+        for url, (success, output) in mirror_cache.sync(urls, workers).items():
+            if success:
+                logger.debug("Mirror of '%s' is updated", url)
+            else:
+                failed += 1
+                logger.error("Cannot update the mirror of '{}':\n{}".format(url, output))
+
+        logger.info("{} mirrors updated, {} failed".format(len(set(urls)) - failed, failed))
+
 class PackageCommand(object):
 
     def __init__(self, vcp):
@@ -352,3 +621,21 @@ class PackageCommand(object):
         else:
             package_handler = self.vcp.package_factory.create(language)
             package_handler.install_requirements()
+
+    def system_manager(self, name):
+        if name is None:
+            handler = self.vcp.system_package_manager_handler
+            source = 'detected' if self.vcp.system_package_manager is None else 'configured'
+            self.vcp.output.writeln("{} ({})".format(handler.name if handler else 'unknown', source))
+            return
+
+        if name == 'auto':
+            name = None
+        elif name == 'detect':
+            name = SystemPackageManagerHandlerFactory().detect()
+            if name is None:
+                raise SystemPackageManagerHandlerException("Cannot determine the current system distro name.")
+
+        self.vcp.system_package_manager = name
+        self.vcp.save_config()
+        logger.info("System package manager is set to: {}".format(name or 'auto'))
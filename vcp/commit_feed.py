@@ -0,0 +1,104 @@
+import heapq
+import logging
+from queue import Queue
+from threading import Thread
+from datetime import datetime
+from collections import namedtuple, OrderedDict
+
+from .box import Box
+
+logger = logging.getLogger(__name__)
+
+class CommitRecord(namedtuple('CommitRecord', ['time', 'repository', 'sha', 'author', 'subject'])):
+    """One commit of a repository, time is the author time (unix timestamp)"""
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.time)
+
+    @property
+    def day(self):
+        return self.datetime.date().isoformat()
+
+    @property
+    def data(self):
+        return OrderedDict([
+            ('repo', self.repository.name),
+            ('sha', self.sha),
+            ('time', self.datetime.isoformat()),
+            ('day', self.day),
+            ('author', self.author),
+            ('subject', self.subject),
+        ])
+
+    def __str__(self):
+        return "{} {} {} {}".format(self.datetime.strftime('%Y-%m-%d %H:%M'), self.repository.name, self.sha[:7], self.subject)
+
+class CommitGroupBox(Box):
+    """Commits of one day"""
+
+    def __init__(self, day, commits):
+        self.commits = commits
+        super(CommitGroupBox, self).__init__(day, "\n".join([str(c) for c in commits]))
+
+    @property
+    def data(self):
+        return OrderedDict([
+            ('day', self.caption),
+            ('commits', [c.data for c in self.commits]),
+        ])
+
+_END = object()
+
+def _produce(queue, func, repository):
+    try:
+        for commit in func(repository):
+            queue.put(commit)
+    except Exception:
+        logger.exception("Cannot read the commits of '%s'", repository.name)
+    finally:
+        queue.put(_END)
+
+def _consume(queue):
+    while True:
+        item = queue.get()
+        if item is _END:
+            return
+        yield item
+
+def merge_commits(repositories, func):
+    """Read the commits of the repositories in parallel and merge them into one time ordered stream
+
+    Args:
+        repositories (list): Repository instances
+        func (callable): called with a repository, must return an iterable of CommitRecords in chronological order
+
+    Yields:
+        CommitRecord, the oldest first
+    """
+    streams = []
+    for repo in repositories:
+        queue = Queue()
+        thread = Thread(target = _produce, args = (queue, func, repo))
+        thread.daemon = True
+        thread.start()
+        streams.append(_consume(queue))
+
+    return heapq.merge(*streams, key = lambda commit: commit.time)
+
+def group_by_day(commits):
+    """Group a time ordered commit stream by day
+
+    Yields:
+        CommitGroupBox
+    """
+    day = None
+    group = []
+    for commit in commits:
+        if commit.day != day and len(group):
+            yield CommitGroupBox(day, group)
+            group = []
+        day = commit.day
+        group.append(commit)
+    if len(group):
+        yield CommitGroupBox(day, group)
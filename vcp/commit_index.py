@@ -0,0 +1,186 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    author TEXT,
+    time INTEGER,
+    subject TEXT,
+    PRIMARY KEY (repo, sha)
+);
+CREATE INDEX IF NOT EXISTS commits_author_time ON commits (repo, author, time);
+CREATE INDEX IF NOT EXISTS commits_time ON commits (time);
+CREATE TABLE IF NOT EXISTS parents (
+    repo TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    PRIMARY KEY (repo, sha, parent)
+);
+CREATE TABLE IF NOT EXISTS refs (
+    repo TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    PRIMARY KEY (repo, ref)
+);
+CREATE TABLE IF NOT EXISTS heads (
+    repo TEXT PRIMARY KEY,
+    head TEXT,
+    upstream TEXT,
+    user TEXT
+);
+"""
+
+ANCESTORS = """
+WITH RECURSIVE ancestors(sha) AS (
+    SELECT :tip
+    UNION
+    SELECT p.parent FROM parents p JOIN ancestors a ON p.repo = :repo AND p.sha = a.sha
+)
+"""
+
+RANGE = """
+WITH RECURSIVE excluded(sha) AS (
+    SELECT :exclude
+    UNION
+    SELECT p.parent FROM parents p JOIN excluded e ON p.repo = :repo AND p.sha = e.sha
+), included(sha) AS (
+    SELECT :include WHERE :include NOT IN excluded
+    UNION
+    SELECT p.parent FROM parents p JOIN included i ON p.repo = :repo AND p.sha = i.sha WHERE p.parent NOT IN excluded
+)
+SELECT c.sha, c.subject FROM commits c JOIN included i ON c.repo = :repo AND c.sha = i.sha ORDER BY c.time DESC, c.rowid DESC
+"""
+
+def oneline(sha, subject):
+    return "{} {}".format(sha[:7], subject)
+
+class CommitIndex(object):
+    """SQLite index of the commits of the registered repositories
+
+    The index is updated incrementally: only the commits which are not reachable from the last indexed refs are read.
+
+    Args:
+        path (str): the database file path
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.__connection = None
+
+    @property
+    def connection(self):
+        if self.__connection is None:
+            self.__connection = sqlite3.connect(self.path)
+            self.__connection.executescript(SCHEMA)
+        return self.__connection
+
+    def get_head(self, repo):
+        return self.connection.execute("SELECT head, upstream, user FROM heads WHERE repo = ?", (repo.name, )).fetchone()
+
+    def get_ref(self, repo, ref):
+        row = self.connection.execute("SELECT sha FROM refs WHERE repo = ? AND ref = ?", (repo.name, ref)).fetchone()
+        return row[0] if row else None
+
+    def update(self, repo):
+        """Read the new commits of the repository
+
+        Returns:
+            int: number of the new commits
+        """
+        refs = repo.get_refs()
+        old_tips = set([row[0] for row in self.connection.execute("SELECT sha FROM refs WHERE repo = ?", (repo.name, ))])
+        new_tips = set(refs.values()) - old_tips
+
+        count = 0
+        with self.connection:
+            if len(new_tips):
+                for sha, parents, author, time, subject in repo.iter_commits(new_tips, old_tips):
+                    self.connection.execute("INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?)", (repo.name, sha, author, time, subject))
+                    self.connection.executemany("INSERT OR IGNORE INTO parents VALUES (?, ?, ?)", [(repo.name, sha, p) for p in parents])
+                    count += 1
+
+            self.connection.execute("DELETE FROM refs WHERE repo = ?", (repo.name, ))
+            self.connection.executemany("INSERT INTO refs VALUES (?, ?, ?)", [(repo.name, ref, sha) for ref, sha in refs.items()])
+            head, upstream = repo.get_head_names()
+            self.connection.execute("INSERT OR REPLACE INTO heads VALUES (?, ?, ?, ?)", (repo.name, head, upstream, repo.get_user_name()))
+
+        logger.debug("Commit index of '%s' updated, %s new commits", repo.name, count)
+        return count
+
+    def remove(self, name):
+        with self.connection:
+            for table in ['commits', 'parents', 'refs', 'heads']:
+                self.connection.execute("DELETE FROM {} WHERE repo = ?".format(table), (name, ))
+
+    def __ensure_fresh(self, repo):
+        """Update the index if the repository has never been indexed or the HEAD moved since the last update"""
+        if self.get_head(repo) is None or self.get_ref(repo, 'HEAD') != repo.get_head_sha():
+            self.update(repo)
+
+    def get_range(self, repo, include, exclude):
+        """Get the commits reachable from include but not from exclude (like git log exclude..include)
+
+        Returns:
+            list of oneline formatted commits, the newest first
+        """
+        if include is None:
+            return []
+        rows = self.connection.execute(RANGE, dict(repo = repo.name, include = include, exclude = exclude or ''))
+        return [oneline(sha, subject) for sha, subject in rows]
+
+    def get_new_commits(self, repo):
+        self.__ensure_fresh(repo)
+        head, upstream, user = self.get_head(repo)
+        if upstream is None:
+            return []
+        return self.get_range(repo, self.get_ref(repo, upstream), self.get_ref(repo, 'HEAD'))
+
+    def pushables(self, repo, remote):
+        self.__ensure_fresh(repo)
+        head, upstream, user = self.get_head(repo)
+        ref = upstream if remote is None else 'refs/remotes/' + remote
+        remote_sha = self.get_ref(repo, ref) if ref else None
+        if remote_sha is None:
+            return []
+        return self.get_range(repo, self.get_ref(repo, 'HEAD'), remote_sha)
+
+    def get_commits_from_last_tag(self, repo):
+        self.__ensure_fresh(repo)
+        head = self.get_ref(repo, 'HEAD')
+        query = ANCESTORS + """
+            SELECT r.sha FROM ancestors a
+            JOIN refs r ON r.repo = :repo AND r.sha = a.sha AND r.ref LIKE 'refs/tags/%'
+            JOIN commits c ON c.repo = :repo AND c.sha = a.sha
+            ORDER BY c.time DESC, c.rowid DESC LIMIT 1
+        """
+        row = self.connection.execute(query, dict(repo = repo.name, tip = head)).fetchone()
+        if row is None:
+            return []
+        return self.get_range(repo, head, row[0])
+
+    def get_own_commits_since(self, repo, since):
+        """
+        Args:
+            since (datetime): the start of the period
+        """
+        self.__ensure_fresh(repo)
+        head, upstream, user = self.get_head(repo)
+        rows = self.connection.execute("SELECT sha, subject FROM commits WHERE repo = ? AND author = ? AND time >= ? ORDER BY time DESC, rowid DESC",
+                                       (repo.name, user, int(since.timestamp())))
+        return "".join([oneline(sha, subject) + "\n" for sha, subject in rows])
+
+    def search(self, text, limit = 100):
+        """Search in the commit subjects of all the indexed repositories
+
+        Returns:
+            list of (repo name, sha, time, subject) tuples, the newest first
+        """
+        query = "SELECT repo, sha, time, subject FROM commits WHERE subject LIKE ? ESCAPE '\\' ORDER BY time DESC, rowid DESC LIMIT ?"
+        # the wildcards of the LIKE are searched literally
+        pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return self.connection.execute(query, ('%{}%'.format(pattern), limit)).fetchall()
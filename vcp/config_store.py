@@ -0,0 +1,151 @@
+import os
+import json
+import fcntl
+import logging
+import tempfile
+from copy import deepcopy
+from contextlib import contextmanager
+
+from voidpp_tools.json_encoder import JsonEncoder
+from voidpp_tools.json_config import JSONConfigFormatter
+from voidpp_tools.config_loader import ConfigLoader, ConfigLoaderException, ConfigFileNotFoundException
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def merge_config(base, ours, theirs):
+    """Three-way merge of config dicts
+
+    Only the keys changed by us (from base to ours) are applied to theirs, so the parallel modifications of the
+    other keys are preserved. Dicts are merged recursively.
+
+    Args:
+        base (dict): the config as it was loaded
+        ours (dict): the config as we want to save
+        theirs (dict): the config as it is on the disk now
+
+    Returns:
+        dict: the merged config (theirs is modified in place)
+    """
+    for key in set(base.keys()) | set(ours.keys()):
+        base_value = base.get(key, _MISSING)
+        our_value = ours.get(key, _MISSING)
+
+        if base_value == our_value:
+            continue
+
+        if our_value is _MISSING:
+            theirs.pop(key, None)
+            continue
+
+        their_value = theirs.get(key, _MISSING)
+
+        if isinstance(our_value, dict) and isinstance(their_value, dict):
+            merge_config(base_value if isinstance(base_value, dict) else {}, our_value, their_value)
+        else:
+            theirs[key] = deepcopy(our_value)
+
+    return theirs
+
+class SafeJSONConfigLoader(ConfigLoader):
+    """JSON config loader for the parallel running processes
+
+    The save is serialized with a lock file, it merges only our changes into the current content of the file (see
+    merge_config) and replaces the file atomically, so the readers never see a half written config.
+
+    Args:
+        base_path (str): a custom path which may be contains the config
+        encoder (json.JSONEncoder): the encoder class for the save
+    """
+
+    def __init__(self, base_path, encoder = JsonEncoder):
+        self.__encoder = encoder
+        super(SafeJSONConfigLoader, self).__init__(JSONConfigFormatter(encoder), base_path)
+        self.__filename = None
+        self.__base = {}
+
+    @property
+    def filename(self):
+        return self.__filename
+
+    def load(self, filename, create = None, default_conf = {}):
+        """Load the first config file found in the sources (see ConfigLoader.load)"""
+        tries = []
+        for source in self.sources:
+            file_path = os.path.join(source, filename)
+            tries.append(file_path)
+            if os.path.exists(file_path):
+                self.__filename = file_path
+                data = self.__read()
+                self.__base = deepcopy(data)
+                return data
+
+        if create is not None:
+            self.__filename = os.path.join(create, filename)
+            self.save(default_conf)
+            return default_conf
+
+        raise ConfigFileNotFoundException("Config file not found in: %s" % tries)
+
+    def __normalize(self, data):
+        """Convert the data to the same basic types as the loaded ones"""
+        return json.loads(json.dumps(data, cls = self.__encoder))
+
+    @property
+    def lock_filename(self):
+        return self.filename + '.lock'
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_filename, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __read(self):
+        try:
+            with open(self.filename) as f:
+                return json.load(f)
+        except (IOError, OSError):
+            return {}
+        except ValueError as e:
+            raise ConfigLoaderException("Config file '%s' is invalid: %s" % (self.filename, e))
+
+    def __write(self, data):
+        dirname = os.path.dirname(self.filename)
+        fd, tmp_filename = tempfile.mkstemp(dir = dirname, prefix = '.vcp.', suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps(data))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.filename):
+                os.chmod(tmp_filename, os.stat(self.filename).st_mode & 0o7777)
+            os.replace(tmp_filename, self.filename)
+        except Exception:
+            os.remove(tmp_filename)
+            raise
+
+    def save(self, data):
+        if self.filename is None:
+            raise ConfigLoaderException("Load not called yet!")
+
+        try:
+            ours = self.__normalize(data)
+        except (TypeError, ValueError) as e:
+            raise ConfigLoaderException("Config data is not serializable: %s" % e)
+
+        # the file of a newly created config must be written even if the content is the same as the (empty) base
+        if ours == self.__base and os.path.exists(self.filename):
+            logger.debug("Config is not changed, nothing to save")
+            return
+
+        with self.lock():
+            merged = merge_config(self.__base, ours, self.__read())
+            self.__write(merged)
+
+        # the base is what we have written, so the keys of the others will not be seen as our deletions next time
+        self.__base = ours
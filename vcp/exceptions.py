@@ -15,3 +15,6 @@ class RepositoryCommandException(RepositoryException):
 
 class SystemPackageManagerHandlerException(Exception):
     pass
+
+class PythonEnvironmentException(Exception):
+    pass
@@ -1,8 +1,11 @@
 import os
+import json
+import hashlib
 import logging
 from abc import ABCMeta, abstractmethod, abstractproperty
 from subprocess import check_output, CalledProcessError, list2cmdline, check_call
 from virtualenvapi.manage import VirtualEnvironment
+from virtualenvapi.exceptions import PackageInstallationException
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,38 @@ class PythonEnvironment(VirtualEnvironment, EnvironmentBase):
     def last_status(self):
         return True
 
+    def get_editable_paths(self):
+        """
+        Returns:
+            set: real paths of the installed editable packages
+        """
+        try:
+            packages = json.loads(self._execute_pip(['list', '--editable', '--format=json'], log = False))
+        except (CalledProcessError, ValueError):
+            logger.debug("Cannot list the editable packages in '%s'", self.path)
+            return set()
+        # the 'location' key is used by the pip versions before 21.3
+        return set([os.path.realpath(p.get('editable_project_location', p.get('location', ''))) for p in packages])
+
+    def install_editables(self, paths):
+        """Install the not yet installed packages as editable with one pip call, so the resolver runs only once
+
+        Args:
+            paths (list): the package paths
+        """
+        installed = self.get_editable_paths()
+        paths = [path for path in paths if os.path.realpath(path) not in installed]
+        if not len(paths):
+            logger.debug("All editable packages are installed already in '%s'", self.path)
+            return
+        args = ['install']
+        for path in paths:
+            args += ['-e', path]
+        try:
+            self._execute_pip(args)
+        except CalledProcessError as e:
+            raise PackageInstallationException((e.returncode, e.output, ' '.join(paths)))
+
 class JavascriptEnvironment(dict, EnvironmentBase):
 
     def __init__(self, path, config = {}, npm_usage_config = {}):
@@ -35,6 +70,9 @@ class JavascriptEnvironment(dict, EnvironmentBase):
         self.__bin = npm_usage_config.get('command_override', 'npm')
         self.__last_status = False
         self.__do_status_check = npm_usage_config.get('check_status', True)
+        # package name -> path of the linked dependencies, it is the part of the stamp
+        self.linked_packages = {}
+        self.__install_failed = False
 
     @property
     def last_status(self):
@@ -51,20 +89,66 @@ class JavascriptEnvironment(dict, EnvironmentBase):
     def npm(self, command):
         return self.cmd([self.__bin] + command)
 
-    def link(self, name = None):
-        cmd = ['link']
-        if name:
-            cmd.append(name)
-        return self.npm(cmd)
+    def link(self, *names):
+        """Link the packages in one npm call, or without names link the current package globally"""
+        return self.npm(['link'] + list(names))
+
+    def is_linked(self, name, path):
+        """
+        Returns:
+            bool: True if the node_modules/<name> is a link to the path
+        """
+        link_path = os.path.join(self.path, 'node_modules', name)
+        return os.path.islink(link_path) and os.path.realpath(link_path) == os.path.realpath(path)
+
+    @property
+    def stamp_filename(self):
+        return os.path.join(self.path, 'node_modules', '.vcp_stamp')
+
+    def compute_stamp(self):
+        """Hash of the package.json, the lockfiles and the linked dependencies"""
+        digest = hashlib.sha1()
+        for name in ['package.json', 'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock']:
+            filename = os.path.join(self.path, name)
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as f:
+                    digest.update(name.encode() + b'\0' + f.read() + b'\0')
+        for name in sorted(self.linked_packages):
+            digest.update("{}={}\0".format(name, os.path.realpath(self.linked_packages[name])).encode())
+        return digest.hexdigest()
+
+    def is_stamp_valid(self):
+        try:
+            with open(self.stamp_filename) as f:
+                return f.read().strip() == self.compute_stamp()
+        except (IOError, OSError):
+            return False
+
+    def write_stamp(self):
+        if not os.path.isdir(os.path.dirname(self.stamp_filename)):
+            return
+        with open(self.stamp_filename, 'w') as f:
+            f.write(self.compute_stamp())
 
     def get_status(self):
+        """Check the installed packages, the stamp is written only if the install (if it was called) and the check
+        are succeeded"""
+        if self.is_stamp_valid():
+            logger.debug("Nothing changed since the last successful install in %s", self.path)
+            self.__last_status = True
+            return True
+
         if not self.__do_status_check:
+            if not self.__install_failed:
+                self.write_stamp()
             return True
 
         try:
             # npm ls will return 1 when there is an error with the packages (missing, extranous, etc...)
             check_call([self.__bin, 'ls'], env = self.__env, cwd = self.path)
             self.__last_status = True
+            if not self.__install_failed:
+                self.write_stamp()
         except CalledProcessError as e:
             self.__last_status = False
 
@@ -75,8 +159,14 @@ class JavascriptEnvironment(dict, EnvironmentBase):
 
         if name:
             cmd.append(name)
+        elif self.is_stamp_valid():
+            logger.debug("Skip npm install, nothing changed since the last successful install in %s", self.path)
+            return b''
         else:
-            return self.npm(cmd)
+            res = self.npm(cmd)
+            # the failed install is never stamped, so it is retried at the next run (see get_status)
+            self.__install_failed = res is None
+            return res
 
         if save:
             cmd.append('--save')
@@ -0,0 +1,107 @@
+import os
+import re
+import shutil
+import hashlib
+import logging
+import tempfile
+from subprocess import Popen, PIPE, STDOUT
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# the branches which exist in the remote now, the mirror keeps the deleted ones too, so the workspaces prune by these
+LIVE_HEADS = 'refs/live/heads/'
+
+class MirrorCache(object):
+    """Local bare mirrors of the remote repositories, one per url
+
+    The clones use the mirrors as alternates and the fetches update the mirror first, so the objects are downloaded
+    only once for all the workspaces. The mirrors are never pruned, otherwise the workspaces would lose objects, the
+    current branches of the remote are kept under LIVE_HEADS.
+
+    Args:
+        path (str): the folder of the mirrors
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+    def get_path(self, url):
+        """
+        Returns:
+            str: the path of the mirror of the url (it may not exist)
+        """
+        name = re.sub(r'[^\w.-]', '_', url.rstrip('/').split('/')[-1])
+        if not name.endswith('.git'):
+            name += '.git'
+        return os.path.join(self.path, '{}-{}'.format(hashlib.sha1(url.encode()).hexdigest()[:12], name))
+
+    def exists(self, url):
+        return os.path.isdir(self.get_path(url))
+
+    def __git(self, command, cwd = None):
+        logger.debug("Execute command: '%s' in '%s'", ' '.join(command), cwd)
+        p = Popen(['git'] + command, cwd = cwd, stdout = PIPE, stderr = STDOUT, universal_newlines = True)
+        output, _ = p.communicate()
+        return p.returncode == 0, output
+
+    def create(self, url):
+        """Clone the mirror of the url"""
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        logger.info("Create mirror of '%s'", url)
+
+        # clone it into a temporary folder, so a half ready mirror never will be used
+        build_path = tempfile.mkdtemp(dir = self.path, prefix = '.build-')
+        success, output = self.__git(['clone', '--mirror', '--quiet', url, build_path])
+        if not success:
+            shutil.rmtree(build_path)
+            return False, output
+
+        self.__protect_objects(build_path)
+        # the clone is the current state of the remote, the live refs can be copied locally
+        self.__git(['fetch', '--quiet', '.', '+refs/heads/*:{}*'.format(LIVE_HEADS)], build_path)
+
+        try:
+            os.rename(build_path, self.get_path(url))
+        except OSError:
+            # an other process was faster
+            shutil.rmtree(build_path)
+
+        return True, output
+
+    def update(self, url):
+        """Create the mirror if it does not exist, else fetch it
+
+        Returns:
+            tuple: (success, output)
+        """
+        if not self.exists(url):
+            return self.create(url)
+        path = self.get_path(url)
+        # the mirrors created by the older versions are not protected yet
+        self.__protect_objects(path)
+        success, output = self.__git(['remote', 'update', '--no-prune'], path)
+        if not success:
+            return success, output
+        # only the live refs are pruned, the objects are kept anyway (see __protect_objects)
+        live_success, live_output = self.__git(['fetch', '--prune', 'origin', '+refs/heads/*:{}*'.format(LIVE_HEADS)], path)
+        return live_success, output + live_output
+
+    def __protect_objects(self, path):
+        """The workspaces borrow the objects of the mirror (alternates), so they must never be pruned or garbage
+        collected, even if the refs which point to them are deleted or force pushed in the remote"""
+        for name, value in [('gc.auto', '0'), ('gc.pruneExpire', 'never'), ('gc.reflogExpireUnreachable', 'never'),
+                            ('fetch.prune', 'false'), ('remote.origin.prune', 'false')]:
+            self.__git(['config', name, value], path)
+
+    def sync(self, urls, workers = 8):
+        """Update the mirrors of the urls in parallel
+
+        Returns:
+            dict: url -> (success, output)
+        """
+        urls = sorted(set(urls))
+        with ThreadPoolExecutor(workers) as executor:
+            return dict(zip(urls, executor.map(self.update, urls)))
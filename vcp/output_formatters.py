@@ -0,0 +1,90 @@
+import json
+from abc import ABCMeta, abstractmethod
+
+from .box import Box
+
+def register(name):
+    def wrapper(cls):
+        OutputFormatterFactory.types[name] = cls
+        return cls
+    return wrapper
+
+class OutputFormatterFactory(object):
+    types = {}
+
+    def create(self, name, vcp):
+        return self.types[name](vcp)
+
+class OutputFormatterBase(object, metaclass=ABCMeta):
+    """Writes the results of a command to the user
+
+    Usage: call begin() once, write() or write_data() for every result, end() once
+    """
+
+    def __init__(self, vcp):
+        self.vcp = vcp
+
+    def begin(self):
+        pass
+
+    @abstractmethod
+    def write(self, box):
+        pass
+
+    @abstractmethod
+    def write_data(self, data):
+        pass
+
+    def end(self):
+        pass
+
+@register('box')
+class BoxFormatter(OutputFormatterBase):
+
+    def write(self, box):
+        if not isinstance(box, Box):
+            self.write_data(box)
+            return
+        if box.raw:
+            if len(box.content):
+                self.vcp.output.writeln(box.content)
+            return
+        box.reconfig(self.vcp.output_format['header'])
+        self.vcp.output.writeln(self.vcp.box_renderer.render(box))
+
+    def write_data(self, data):
+        self.vcp.output.writeln(str(data))
+
+class JSONFormatterBase(OutputFormatterBase):
+
+    def __init__(self, vcp, stream = None):
+        super(JSONFormatterBase, self).__init__(vcp)
+        self.stream = stream or vcp.output
+
+    def write(self, box):
+        self.write_data(box.data)
+
+@register('ndjson')
+class NDJSONFormatter(JSONFormatterBase):
+    """One record per line, flushed immediately, so the consumer can process it as soon as it is ready"""
+
+    def write_data(self, data):
+        self.stream.write(json.dumps(data) + "\n")
+        self.stream.flush()
+
+@register('json')
+class JSONFormatter(JSONFormatterBase):
+    """A single json list, but the items are written as soon as they are ready"""
+
+    def begin(self):
+        self.count = 0
+        self.stream.write("[")
+
+    def write_data(self, data):
+        self.stream.write("{}\n  {}".format("," if self.count else "", json.dumps(data)))
+        self.stream.flush()
+        self.count += 1
+
+    def end(self):
+        self.stream.write("\n]\n" if self.count else "]\n")
+        self.stream.flush()
@@ -0,0 +1,52 @@
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+class OutputWriter(object):
+    """Buffered writer for the command results
+
+    The results go directly to the stream instead of the logger, so they are not colored, not formatted and not written
+    to the log file. In debug mode the results are logged too (with the 'vcp.output_writer' logger, debug level).
+
+    Args:
+        stream: file like object, default is the stdout
+        debug (bool): log the results
+        buffer_size (int): flush the buffer when it grows over this size (in characters)
+    """
+
+    def __init__(self, stream = None, debug = False, buffer_size = 64 * 1024):
+        self.stream = stream or sys.stdout
+        self.debug = debug
+        self.buffer_size = buffer_size
+        self.__buffer = []
+        self.__size = 0
+        try:
+            # a human is watching, do not keep back the results
+            self.__line_buffering = self.stream.isatty()
+        except (AttributeError, ValueError):
+            self.__line_buffering = False
+
+    def write(self, text):
+        self.__buffer.append(text)
+        self.__size += len(text)
+        if self.debug:
+            logger.debug(text)
+        if self.__line_buffering:
+            self.flush()
+        elif self.__size >= self.buffer_size:
+            self.__drain()
+
+    def writeln(self, text = ''):
+        self.write(text + "\n")
+
+    def __drain(self):
+        if not self.__buffer:
+            return
+        self.stream.write(''.join(self.__buffer))
+        self.__buffer = []
+        self.__size = 0
+
+    def flush(self):
+        self.__drain()
+        self.stream.flush()
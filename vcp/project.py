@@ -4,14 +4,71 @@ import logging
 from voidpp_tools.terminal import get_size
 from collections import OrderedDict
 import re
+import time
+import hashlib
 from datetime import timedelta, datetime
+from concurrent.futures import ThreadPoolExecutor
 
+from .box import Box
 from .repository_command_result_box import RepositoryCommandResultBox
 from .exceptions import ProjectException, RepositoryCommandException
 from .project_languages import LanguageFactory
+from .commit_feed import merge_commits, group_by_day
 
 logger = logging.getLogger(__name__)
 
+# the files which describe the language dependencies, the languages must be initialized again if any of them changes
+MANIFEST_FILES = ['setup.py', 'setup.json', 'setup.cfg', 'pyproject.toml', 'requirements.txt',
+                  'package.json', 'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock']
+
+CLONE_STRATEGY_KEYS = ['filter', 'depth', 'single_branch']
+
+def parse_oneline_commits(lines):
+    """Convert 'git log --oneline' lines to dicts"""
+    commits = []
+    for line in lines:
+        sha, _, subject = line.partition(' ')
+        commits.append(dict(sha = sha, subject = subject))
+    return commits
+
+def parse_short_status(lines):
+    """Convert 'git status --short' lines to dicts"""
+    return [dict(status = line[:2].strip(), path = line[3:]) for line in lines]
+
+def summarize_diffstat(files):
+    """Sum the changes of the files (see parse_numstat)"""
+    return OrderedDict([
+        ('files', len(files)),
+        ('insertions', sum([f['insertions'] for f in files])),
+        ('deletions', sum([f['deletions'] for f in files])),
+        ('changes', files),
+    ])
+
+def format_diffstat_summary(data):
+    return "{} files changed, {} insertions(+), {} deletions(-)".format(data['files'], data['insertions'], data['deletions'])
+
+def render_stat(data):
+    width = max([len(f['path']) for f in data['changes']])
+    lines = [" {} | +{} -{}".format(f['path'].ljust(width), f['insertions'], f['deletions']) for f in data['changes']]
+    return "\n".join(lines + [format_diffstat_summary(data)])
+
+def render_numstat(data, repository_name):
+    return "\n".join(["{}\t{}\t{}/{}".format(f['insertions'], f['deletions'], repository_name, f['path']) for f in data['changes']])
+
+class DiffStatTotalBox(Box):
+    """Sum of the diff stats of all the repositories"""
+
+    def __init__(self, total, numstat = False):
+        self.total = total
+        # like 'git diff --numstat', the numstat output has no summary line
+        self.raw = numstat
+        content = '' if numstat else "{} repositories, {}".format(total['repositories'], format_diffstat_summary(total))
+        super(DiffStatTotalBox, self).__init__('total', content)
+
+    @property
+    def data(self):
+        return OrderedDict([('command', 'diffstat'), ('total', self.total)])
+
 class TopologicalSorter(object):
     """
     Implements Tarjan's algorithm.
@@ -57,6 +114,8 @@ class Project(object):
     def __init__(self, name, vcp, data = None):
         self.name = name
         self.description = None
+        # the last init failed because of a repository command (eg. clone) error, which is worth to try again
+        self.init_failure_transient = False
         self.languages = []
         self.repo = dict(
             url = None,
@@ -81,16 +140,20 @@ class Project(object):
         projects = list(self.get_dependent_projects().values()) + [self]
         return [p.name for p in projects]
 
+    def get_repository(self, name):
+        """The repository of the project or of a dependency in the current namespace (see VCP.namespace)"""
+        return self.vcp.repositories[self.vcp.get_repository_name(name, self.vcp.namespace)]
+
     @property
     def path(self):
         try:
-            return self.vcp.repositories[self.name].path
+            return self.get_repository(self.name).path
         except KeyError:
             return None
 
     @property
     def initialized(self):
-        return self.name in self.vcp.repositories
+        return self.vcp.get_repository_name(self.name, self.vcp.namespace) in self.vcp.repositories
 
     @property
     def data(self):
@@ -110,14 +173,43 @@ class Project(object):
         self.system_dependencies = value['system_dependencies']
         self.languages = self.vcp.language_factory.create(self, value['languages'])
 
-    def set_dependencies_state(self):
-        for name in self.get_dependent_projects(recursive = False):
+    def set_dependencies_state(self, workers = 8):
+        """Checkout the refs of the direct dependencies in parallel, the ones at the ref already are skipped
+
+        Returns:
+            bool: False if any of the checkouts failed
+        """
+        def switch(name):
+            repo = repos[name]
             ref = self.dependencies[name]
-            try:
-                self.vcp.repositories[name].set_ref(ref)
+            if repo.is_at_ref(ref):
+                return name, ref, 'unchanged', None
+            output = repo.set_ref(ref)
+            if repo.last_returncode == 0:
+                return name, ref, 'switched', None
+            dirty = repo.get_dirty_files()
+            return name, ref, 'blocked' if len(dirty) else 'failed', dirty if len(dirty) else output
+
+        names = sorted(self.get_dependent_projects(recursive = False))
+        # the registry may not be used from other threads (sqlite), so the repositories are resolved here
+        repos = {name: self.get_repository(name) for name in names}
+        with ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(switch, names))
+
+        success = True
+        for name, ref, state, details in results:
+            if state == 'unchanged':
+                logger.debug("'%s' is at '%s' already", name, ref)
+            elif state == 'switched':
                 logger.info("Set ref '%s' for '%s'", ref, name)
-            except RepositoryCommandException as e:
-                logger.error(e.output)
+            elif state == 'blocked':
+                success = False
+                logger.error("Cannot set ref '%s' for '%s', the working tree is dirty:\n%s", ref, name, "\n".join(details))
+            else:
+                success = False
+                logger.error("Cannot set ref '%s' for '%s':\n%s", ref, name, details)
+
+        return success
 
     def search_for_ref_in_deps(self, project_name, projects):
         ref = None
@@ -169,6 +261,7 @@ class Project(object):
             logger.info("URL: '{}', path: '{}'".format(self.repo['url'], repo_dir))
 
         status[self.name] = True
+        self.init_failure_transient = False
 
         try:
             if self.vcp.system_package_manager_handler:
@@ -186,7 +279,7 @@ class Project(object):
                 # create folder
                 os.mkdir(repo_dir)
 
-                repo.init(self.repo['url'], ref)
+                repo.init(self.repo['url'], ref, self.get_clone_strategy())
                 self.vcp.repositories[self.name] = repo
 
             # initialize language specific stuffs
@@ -195,13 +288,134 @@ class Project(object):
                     lang.init()
                     if not lang.env.get_status():
                         status[self.name] = False
+                if status[self.name]:
+                    self.__write_stamp(repo, self.get_manifest_stamp())
 
             return True
         except (Exception, KeyboardInterrupt) as e:
             logger.exception("Error during initialize '{}'. Reverting all the work. Traceback:".format(self.name))
+            self.init_failure_transient = isinstance(e, RepositoryCommandException)
             self.purge()
             return False
 
+    def get_manifest_stamp(self):
+        """Hash of the dependency manifests and the dependency links of the project"""
+        digest = hashlib.sha1()
+        for name in MANIFEST_FILES:
+            filename = os.path.join(self.path, name)
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as f:
+                    digest.update(name.encode() + b'\0' + f.read() + b'\0')
+        for name in sorted(self.dependencies):
+            repo_name = self.vcp.get_repository_name(name, self.vcp.namespace)
+            path = self.vcp.repositories[repo_name].path if repo_name in self.vcp.repositories else None
+            digest.update("{}={}:{}\0".format(name, self.dependencies[name], path).encode())
+        return digest.hexdigest()
+
+    def __read_stamp(self, repo):
+        try:
+            with open(repo.get_meta_filename('manifest_stamp')) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def __write_stamp(self, repo, stamp):
+        with open(repo.get_meta_filename('manifest_stamp'), 'w') as f:
+            f.write(stamp)
+
+    def update(self, base_path, status, workers = 8):
+        """Update the project and its dependencies incrementally
+
+        All the repositories are fetched (in parallel), but only the ones behind their upstream are rebased, and the
+        languages are initialized again only if the dependency manifests or the dependency links have been changed.
+        The not yet initialized dependencies are initialized. The fetched commits are indexed if the commit index is
+        enabled. The projects which cannot be fetched are updated as well, but they are failed in the status.
+
+        Returns:
+            bool: False if any of the projects failed
+        """
+        projects = list(reversed(self.get_sorted_dependencies())) + [self]
+
+        missing = [p.name for p in projects if not p.initialized]
+        if self.vcp.namespace is not None and len(missing):
+            raise ProjectException("Cannot initialize the missing projects in the namespace '{}': {}".format(
+                self.vcp.namespace, ', '.join(missing)))
+
+        def fetch(repo):
+            output = repo.fetch()
+            return repo.last_returncode, output
+
+        # the registry may not be used from other threads (sqlite), so the repositories are resolved here
+        repos = OrderedDict([(p.name, self.get_repository(p.name)) for p in projects if p.initialized])
+        with ThreadPoolExecutor(workers) as executor:
+            results = OrderedDict(zip(repos, executor.map(fetch, repos.values())))
+
+        # the index is sqlite too, so it is updated in this thread
+        index = self.vcp.commit_index
+        fetch_failed = set()
+        for name, (returncode, output) in results.items():
+            if returncode != 0:
+                logger.error("Cannot fetch '%s': %s", name, output.strip())
+                fetch_failed.add(name)
+            elif index:
+                index.update(repos[name])
+
+        for project in projects:
+            if project.initialized:
+                result = project.update_repository(status)
+                if project.name in fetch_failed:
+                    # the repository is updated to the last fetched state, but it may be behind the remote
+                    status[project.name] = False
+            else:
+                ref = self.dependencies.get(project.name) or self.search_for_ref_in_deps(project.name, projects)
+                result = project.init(base_path, status, install_deps = False, ref = ref)
+            if not result:
+                return False
+
+        return True
+
+    def update_repository(self, status):
+        """Rebase the fetched repository if it is behind and initialize the languages if the manifests changed"""
+        repo = self.get_repository(self.name)
+        status[self.name] = True
+
+        try:
+            divergence = repo.get_upstream_divergence()
+            if divergence is None:
+                logger.warning("Repository '%s' has no upstream, skip rebase", self.name)
+            elif divergence[1] > 0:
+                repo.rebase()
+            else:
+                logger.debug("Repository '%s' is up to date", self.name)
+
+            stamp = self.get_manifest_stamp()
+            if stamp == self.__read_stamp(repo):
+                logger.debug("Dependencies of '%s' are not changed", self.name)
+                return True
+
+            for lang in self.languages:
+                lang.init()
+                if not lang.env.get_status():
+                    status[self.name] = False
+
+            if status[self.name]:
+                self.__write_stamp(repo, stamp)
+
+            return True
+        except RepositoryCommandException as e:
+            logger.error("Cannot update '%s': %s", self.name, e)
+            status[self.name] = False
+            return False
+
+    def get_clone_strategy(self):
+        """The global clone strategy updated with the 'clone' node of the project repo config"""
+        strategy = dict(self.vcp.clone_strategy)
+        strategy.update(self.repo.get('clone') or {})
+        unknown = set(strategy) - set(CLONE_STRATEGY_KEYS)
+        if len(unknown):
+            logger.warning("Unknown clone strategy options in '%s': %s", self.name, ', '.join(sorted(unknown)))
+        return strategy
+
     def purge(self):
         path = self.path
 
@@ -256,58 +470,138 @@ class Project(object):
                 projects.update(prj.get_dependent_projects())
         return projects
 
+    def __collect(self, command, func, parser = None, skip_empty = True, names = None, workers = 1, renderer = None,
+                  exit_status = False, after = None):
+        """Run the func on all the repositories of the project
+
+        Args:
+            command (str): name of the command, for the structured output
+            func (callable): called with the repository, returns a list of lines or a string
+            parser (callable): converts the func result to the structured payload
+            skip_empty (bool): do not yield anything for the repositories with empty result
+            names (list): run only on these repositories of the project
+            workers (int): run the func on this many repositories in parallel, the results are yielded in order
+            renderer (callable): converts the payload to the displayed content instead of the func result
+            exit_status (bool): the payload is the output of the last command of the func, so its return code is the
+                exit status of the result, otherwise the exit status is None
+            after (callable): called with the repository after the func, its commands do not change the exit status
+
+        Yields:
+            RepositoryCommandResultBox
+        """
+        repos = [self.get_repository(name) for name in self.repositories if names is None or name in names]
+
+        def run(repo):
+            start = time.time()
+            res = func(repo)
+            returncode = repo.last_returncode if exit_status else None
+            if after:
+                after(repo)
+            return res, returncode, time.time() - start
+
+        if workers > 1:
+            executor = ThreadPoolExecutor(workers)
+            results = executor.map(run, repos)
+        else:
+            executor = None
+            results = map(run, repos)
+
+        try:
+            for repo, (res, returncode, duration) in zip(repos, results):
+                if skip_empty and not len(res):
+                    continue
+                payload = parser(res) if parser else res
+                if renderer:
+                    content = renderer(payload)
+                else:
+                    content = "\n".join(res) if isinstance(res, list) else res
+                yield RepositoryCommandResultBox(repo, content, command, payload, returncode, duration)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    def __ensure_history(self, repo):
+        if repo.ensure_history() and self.vcp.commit_index:
+            # the index does not know the commits behind the old shallow boundary
+            self.vcp.commit_index.remove(repo.name)
+
     def news(self, fromcache):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
+        index = self.vcp.commit_index
+        def get_news(repo):
             if not fromcache:
+                self.__ensure_history(repo)
                 repo.fetch()
-            commits = repo.get_new_commits()
-            if len(commits):
-                yield RepositoryCommandResultBox(repo, "\n".join(commits))
+                if index:
+                    index.update(repo)
+            return index.get_new_commits(repo) if index else repo.get_new_commits()
+        return self.__collect('news', get_news, parse_oneline_commits)
 
     def unreleased(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            commits = repo.get_commits_from_last_tag()
-            if len(commits):
-                yield RepositoryCommandResultBox(repo, "\n".join(commits))
-
-    def diff(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            diff = repo.diff()
-            if len(diff):
-                yield RepositoryCommandResultBox(repo, diff)
+        index = self.vcp.commit_index
+        def get_unreleased(repo):
+            self.__ensure_history(repo)
+            return index.get_commits_from_last_tag(repo) if index else repo.get_commits_from_last_tag()
+        return self.__collect('unreleased', get_unreleased, parse_oneline_commits)
+
+    def diff(self, stat = False, numstat = False, repo = None, path = None, workers = 8):
+        """
+        Args:
+            stat (bool): show only the changed files and the totals, per repository and for the whole project
+            numstat (bool): same as stat, but the lines are in the 'git diff --numstat' format without boxes, the paths
+                are prefixed with the repository name
+            repo (list): show the full diff only for these repositories
+            path (list): show the full diff only for these paths
+            workers (int): number of the parallel stat queries
+        """
+        unknown = set(repo or []) - set(self.repositories)
+        if len(unknown):
+            logger.warning("Repositories are not in the project '%s': %s", self.name, ', '.join(sorted(unknown)))
+
+        if not stat and not numstat:
+            return self.__collect('diff', lambda r: r.diff(path), names = repo, exit_status = True)
+
+        return self.__diff_stat(numstat, repo, path, workers)
+
+    def __diff_stat(self, numstat, repo, path, workers):
+        total = OrderedDict([('repositories', 0), ('files', 0), ('insertions', 0), ('deletions', 0)])
+
+        boxes = self.__collect('diffstat', lambda r: r.get_diff_numstat(), summarize_diffstat, workers = workers,
+                               renderer = render_stat, exit_status = True)
+        for box in boxes:
+            total['repositories'] += 1
+            for key in ['files', 'insertions', 'deletions']:
+                total[key] += box.payload[key]
+            if numstat:
+                box.content = render_numstat(box.payload, box.repository.name)
+                box.raw = True
+            yield box
+
+        if total['repositories']:
+            yield DiffStatTotalBox(total, numstat)
+
+        if repo or path:
+            for box in self.__collect('diff', lambda r: r.diff(path), names = repo, exit_status = True):
+                yield box
 
     def pushables(self, remote):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            commits = repo.pushables(remote)
-            if len(commits):
-                yield RepositoryCommandResultBox(repo, "\n".join(commits))
+        index = self.vcp.commit_index
+        def get_pushables(repo):
+            if index:
+                return index.pushables(repo, remote) + repo.get_unpushed_tags()
+            return repo.pushables(remote)
+        return self.__collect('pushables', get_pushables)
 
     def untracked(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            files = repo.get_untracked_files()
-            if len(files):
-                yield RepositoryCommandResultBox(repo, "\n".join(files))
+        return self.__collect('untracked', lambda repo: repo.get_untracked_files(), exit_status = True)
 
     def dirty(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            files = repo.get_dirty_files()
-            if len(files):
-                yield RepositoryCommandResultBox(repo, "\n".join(files))
+        return self.__collect('dirty', lambda repo: repo.get_dirty_files(), parse_short_status, exit_status = True)
 
     def fetch(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            res = repo.fetch()
-            if len(res):
-                yield RepositoryCommandResultBox(repo, res)
+        index = self.vcp.commit_index
+        return self.__collect('fetch', lambda repo: repo.fetch(), exit_status = True, after = index.update if index else None)
 
-    def standup(self, length):
+    def standup(self, length, merge = False, by_day = False):
         lengths = OrderedDict([
             ('w', 60 * 24 * 7),
             ('d', 60 * 24),
@@ -334,28 +628,27 @@ class Project(object):
 
         since = datetime.now() - time_len
 
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            res = repo.get_own_commits_since(since.isoformat())
-            if len(res):
-                yield RepositoryCommandResultBox(repo, res)
+        if merge or by_day:
+            repos = [self.get_repository(name) for name in self.repositories]
+            for repo in repos:
+                self.__ensure_history(repo)
+            commits = merge_commits(repos, lambda repo: repo.iter_own_commits_since(since.isoformat()))
+            return group_by_day(commits) if by_day else commits
+
+        index = self.vcp.commit_index
+        def get_own_commits(repo):
+            self.__ensure_history(repo)
+            return index.get_own_commits_since(repo, since) if index else repo.get_own_commits_since(since.isoformat())
+        return self.__collect('standup', get_own_commits, lambda res: parse_oneline_commits(res.splitlines()))
 
     def status(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            yield RepositoryCommandResultBox(repo, repo.status())
+        return self.__collect('status', lambda repo: repo.status(), skip_empty = False, exit_status = True)
 
     def reset(self):
-        for name in self.repositories:
-            repo = self.vcp.repositories[name]
-            yield RepositoryCommandResultBox(repo, repo.reset())
+        return self.__collect('reset', lambda repo: repo.reset(), skip_empty = False)
 
     def cmd(self, command):
-        for repo_name in self.repositories:
-            repo = self.vcp.repositories[repo_name]
-            res = repo.cmd(command)
-            if len(res):
-                yield RepositoryCommandResultBox(repo, res)
+        return self.__collect('cmd', lambda repo: repo.cmd(command), exit_status = True)
 
     def __repr__(self):
         return "<Project: %s>" % self.__dict__
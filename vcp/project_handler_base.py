@@ -15,12 +15,13 @@ class ProjectHandlerFactory(object):
     def __init__(self):
         self.schema_pattern = re.compile("^({}):\/\/(.+)".format('|'.join(list(self.handlers.keys()))))
 
-    def create(self, uri, local_path):
+    def create(self, uri, local_path, **options):
         """Create a project handler
 
         Args:
             uri (str): schema://something formatted uri
             local_path (str): the project configs directory
+            options: see ProjectHandlerBase
 
         Return:
             ProjectHandler derived class instance
@@ -34,7 +35,7 @@ class ProjectHandlerFactory(object):
         schema = matches.group(1)
         url = matches.group(2)
 
-        return self.handlers[schema](url, local_path)
+        return self.handlers[schema](url, local_path, **options)
 
 
 def register_schema(schema):
@@ -45,9 +46,19 @@ def register_schema(schema):
 
 class ProjectHandlerBase(object, metaclass=ABCMeta):
 
-    def __init__(self, url, path):
+    def __init__(self, url, path, ttl = 0, background_refresh = False):
+        """
+        Args:
+            url (str): the url part of the uri
+            path (str): the project configs directory
+            ttl (int): seconds, the remote storage is not updated again within this time
+            background_refresh (bool): fetch the remote storage in the background, the result is applied at the next run
+                (at most once in the ttl, or in BACKGROUND_REFRESH_DEFAULT_TTL if the ttl is 0)
+        """
         self.url = url
         self.path = self.get_path(path)
+        self.ttl = ttl
+        self.background_refresh = background_refresh
 
     def get_project_config_path(self, name):
         base_path = os.path.expanduser(self.path)
@@ -107,8 +118,12 @@ class ProjectHandlerBase(object, metaclass=ABCMeta):
                 yaml.dump(data, stream = f, default_flow_style = False)
                 logger.debug("Project '%s' config has been writed to '%s'", name, project_file_path)
 
+    def close(self):
+        """Called at the end of the run"""
+        pass
+
     @abstractmethod
-    def update(self):
+    def update(self, force = False):
         pass
 
     @abstractmethod
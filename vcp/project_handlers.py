@@ -1,5 +1,12 @@
+import re
+import json
 import logging
 import os
+import time
+import yaml
+from subprocess import Popen, DEVNULL
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
 from git import Repo, InvalidGitRepositoryError, GitCommandError
 
 from .version import get_signo
@@ -8,6 +15,9 @@ from .tools import check_call, CalledProcessError
 
 logger = logging.getLogger(__name__)
 
+# seconds, the minimum time between two background fetches if the ttl is not set
+BACKGROUND_REFRESH_DEFAULT_TTL = 300
+
 @register_schema('local')
 class LocalProjectHandler(ProjectHandlerBase):
 
@@ -30,15 +40,17 @@ class LocalProjectHandler(ProjectHandlerBase):
     def remove(self, name, command_result):
         pass
 
-    def update(self):
+    def update(self, force = False):
         pass
 
 @register_schema('git')
 class GitProjectHandler(ProjectHandlerBase):
 
-    def __init__(self, url, path):
-        super(GitProjectHandler, self).__init__(url, path)
+    def __init__(self, url, path, ttl = 0, background_refresh = False):
+        super(GitProjectHandler, self).__init__(url, path, ttl, background_refresh)
         self.__repo = None
+        # the background fetch is started at close, so it never races with the pull of update
+        self.__background_fetch_due = False
 
     def get_path(self, base_path):
         dirname = self.url.split('/')[-1:][0]
@@ -64,10 +76,70 @@ class GitProjectHandler(ProjectHandlerBase):
             self.__clone()
             return
 
-        try:
-            repo = Repo(self.path)
-        except InvalidGitRepositoryError:
+        # cheap check instead of open the repo with GitPython at every start
+        if not os.path.exists(os.path.join(self.path, '.git')):
             self.__clone()
+            return
+
+        if self.background_refresh:
+            self.__apply_fetched()
+            # without ttl a fetch would be started at every run
+            if not self.__is_fresh(self.__fetch_head_filename, self.ttl if self.ttl > 0 else BACKGROUND_REFRESH_DEFAULT_TTL):
+                self.__background_fetch_due = True
+
+    def close(self):
+        if self.__background_fetch_due:
+            self.__background_fetch_due = False
+            self.__fetch_in_background()
+
+    @property
+    def __stamp_filename(self):
+        """Touched after the successful updates"""
+        return os.path.join(self.path, '.git', 'vcp_last_update')
+
+    @property
+    def __applied_filename(self):
+        """Touched after the background fetch result has been applied (or tried to), so it is applied only once"""
+        return os.path.join(self.path, '.git', 'vcp_last_apply')
+
+    @property
+    def __fetch_head_filename(self):
+        return os.path.join(self.path, '.git', 'FETCH_HEAD')
+
+    def __get_mtime(self, filename):
+        try:
+            return os.path.getmtime(filename)
+        except OSError:
+            return 0
+
+    def __is_fresh(self, filename, ttl = None):
+        return time.time() - self.__get_mtime(filename) < (self.ttl if ttl is None else ttl)
+
+    def __touch(self, filename):
+        with open(filename, 'w'):
+            pass
+
+    def __fetch_in_background(self):
+        """Start a fetch and do not wait for it, the result will be applied at the next run"""
+        logger.debug("Fetch the project config repo in the background")
+        Popen(['git', 'fetch', '--quiet'], cwd = self.path, stdin = DEVNULL, stdout = DEVNULL, stderr = DEVNULL,
+              start_new_session = True)
+
+    def __apply_fetched(self):
+        """Rebase to the result of the last background fetch if it is not applied yet (no network)"""
+        if self.__get_mtime(self.__fetch_head_filename) <= self.__get_mtime(self.__applied_filename):
+            return
+        try:
+            check_call(['git', 'rebase', '@{u}'], cwd = self.path)
+            self.__touch(self.__stamp_filename)
+            logger.debug("Project config repo updated from the last background fetch.")
+        except CalledProcessError as e:
+            logger.error("Cannot apply the fetched project configs because of:\n%s", e.output)
+            try:
+                check_call(['git', 'rebase', '--abort'], cwd = self.path)
+            except CalledProcessError:
+                pass
+        self.__touch(self.__applied_filename)
 
     def post_process_cli_config(self, config):
         add_nopush = ['edit', 'create', 'remove']
@@ -118,9 +190,143 @@ class GitProjectHandler(ProjectHandlerBase):
             self.__push()
         logger.info("Project config removed{}".format("." if nopush else " and pushed to the remote."))
 
-    def update(self):
+    def update(self, force = False):
+        # the pull fetches anyway
+        self.__background_fetch_due = False
+        if not force and self.__is_fresh(self.__stamp_filename):
+            logger.info("Project config repo has been updated in the last {} seconds.".format(self.ttl))
+            return
         try:
             check_call(['git', 'pull', '--rebase'], cwd = self.path)
+            self.__touch(self.__stamp_filename)
+            # the FETCH_HEAD of the pull is applied already
+            self.__touch(self.__applied_filename)
             logger.info("Project config repo updated.")
         except CalledProcessError as e:
             logger.error("Cannot update the project's repository because of:\n%s", e.output)
+
+# seconds, after it the cached index is used
+HTTP_TIMEOUT = 10
+
+@register_schema('http')
+class HTTPProjectHandler(ProjectHandlerBase):
+    """Read only storage: one bundled index (yaml or json, project name -> project data) downloaded from a http server
+
+    The index is revalidated with ETag/If-Modified-Since, so the usual response is a cheap 304. The last downloaded
+    index is kept in the local path, if the server is not available the cached one is used.
+    """
+
+    schema = 'http'
+
+    INDEX_FILENAME = 'index.yaml'
+    META_FILENAME = 'index.meta.json'
+
+    @property
+    def remote_url(self):
+        return '{}://{}'.format(self.schema, self.url)
+
+    def get_path(self, base_path):
+        dirname = re.sub(r'[^\w.-]', '_', self.url.rstrip('/'))
+        return os.path.join(base_path, dirname)
+
+    @property
+    def __index_filename(self):
+        return os.path.join(self.path, self.INDEX_FILENAME)
+
+    @property
+    def __meta_filename(self):
+        return os.path.join(self.path, self.META_FILENAME)
+
+    def __load_meta(self):
+        try:
+            with open(self.__meta_filename) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def __write(self, filename, content):
+        # write to a temporary file first, so an interrupted download never corrupts the cache
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            f.write(content)
+        os.rename(temp_filename, filename)
+
+    def refresh(self, force = False):
+        """Download the index if it has been changed on the server
+
+        Returns:
+            bool: False if the server is not available
+        """
+        meta = self.__load_meta()
+        has_cache = os.path.isfile(self.__index_filename)
+
+        if has_cache and not force and time.time() - meta.get('fetched_at', 0) < self.ttl:
+            logger.debug("Project config index has been fetched in the last %s seconds.", self.ttl)
+            return True
+
+        request = Request(self.remote_url)
+        if has_cache:
+            if meta.get('etag'):
+                request.add_header('If-None-Match', meta['etag'])
+            if meta.get('last_modified'):
+                request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            with urlopen(request, timeout = HTTP_TIMEOUT) as response:
+                self.__write(self.__index_filename, response.read())
+                meta = dict(etag = response.headers.get('ETag'), last_modified = response.headers.get('Last-Modified'))
+                logger.debug("Project config index downloaded from %s", self.remote_url)
+        except HTTPError as e:
+            if e.code != 304 or not has_cache:
+                logger.warning("Cannot download the project config index from %s: %s", self.remote_url, e)
+                return False
+            logger.debug("Project config index is not modified")
+        except (URLError, OSError) as e:
+            logger.warning("Cannot download the project config index from %s: %s. The cached one is used.", self.remote_url, e)
+            return False
+
+        meta['fetched_at'] = time.time()
+        self.__write(self.__meta_filename, json.dumps(meta).encode())
+        return True
+
+    def config_init(self):
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+        self.refresh()
+
+    def load(self):
+        if not os.path.isfile(self.__index_filename):
+            return {}
+
+        logger.debug("Load project configs from %s", self.__index_filename)
+
+        with open(self.__index_filename) as f:
+            try:
+                return yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                logger.error("Cannot parse the project config index: %s", e)
+                return {}
+
+    def save(self, projects):
+        logger.warning("The project configs are read only in the {} storage, the changes are not saved.".format(self.schema))
+
+    def post_process_cli_config(self, config):
+        pass
+
+    def edit(self, name, summary, command_result):
+        pass
+
+    def create(self, name, default, command_result):
+        pass
+
+    def remove(self, name, command_result):
+        pass
+
+    def update(self, force = False):
+        if self.refresh(force):
+            logger.info("Project config index updated.")
+
+@register_schema('https')
+class HTTPSProjectHandler(HTTPProjectHandler):
+
+    schema = 'https'
@@ -68,9 +68,12 @@ class Python(LanguageBase):
     @property
     def env(self):
         if self._env is None:
-            self._env = PythonEnvironment(self.__env_path, python = 'python2')
+            self._env = PythonEnvironment(self.__env_path, python = self.project.vcp.python_interpreter)
             if not self._env._pip_exists():
                 logger.info("Create virtual environment for project '{}'".format(self.project.name))
+                if os.path.isdir(self.__env_path):
+                    shutil.rmtree(self.__env_path)
+                self.project.vcp.python_venv_template.clone(self.__env_path)
             self._env.open_or_create()
         return self._env
 
@@ -82,11 +85,15 @@ class Python(LanguageBase):
         self.install_dev(self.project.path, env)
 
     def init(self):
-        for name, project in list(self.project.get_dependent_projects().items()):
-            project.install_to(self.project, self.env)
-
-        logger.info("Install '{}' as editable package".format(self.project.name))
-        return self.install_dev(self.project.path, self.env)
+        paths = []
+        for project in self.project.get_sorted_dependencies():
+            if any(isinstance(lang, Python) for lang in project.languages):
+                paths.append(project.path)
+        paths.append(self.project.path)
+
+        logger.info("Install '{}' and its {} dependencies as editable packages".format(self.project.name, len(paths) - 1))
+        self.env.install_editables(paths)
+        return True
 
     def purge(self):
         if os.path.isdir(self.__env_path):
@@ -96,6 +103,9 @@ class Python(LanguageBase):
 @register('javascript')
 class Javascript(LanguageBase):
 
+    # project path -> package name, the package.json is read only once per run
+    package_names = {}
+
     @property
     def env(self):
         if self._env is None:
@@ -103,9 +113,11 @@ class Javascript(LanguageBase):
         return self._env
 
     def get_package_name(self):
-        with open(os.path.join(self.project.path, 'package.json')) as f:
-            data = json.load(f)
-            return data['name']
+        path = self.project.path
+        if path not in self.package_names:
+            with open(os.path.join(path, 'package.json')) as f:
+                self.package_names[path] = json.load(f)['name']
+        return self.package_names[path]
 
     def install_to(self, project, env):
         if self.project.path is None:
@@ -122,8 +134,21 @@ class Javascript(LanguageBase):
             direct_dep_names = list(self.project.dependencies.keys())
             deps = [p for p in all_deps if p.name in direct_dep_names]
 
+            names = []
             for project in reversed(deps):
-                project.install_to(self.project, self.env)
+                for lang in project.languages:
+                    if not isinstance(lang, Javascript):
+                        continue
+                    name = lang.get_package_name()
+                    self.env.linked_packages[name] = project.path
+                    if self.env.is_linked(name, project.path):
+                        logger.debug("Package '%s' is linked already in %s", name, self.project.name)
+                    else:
+                        names.append(name)
+
+            if len(names):
+                logger.info("Make links in {} to {}".format(self.project.name, ', '.join(names)))
+                self.env.link(*names)
 
             logger.info("Install all the npm dependencies.")
 
@@ -0,0 +1,243 @@
+import os
+import json
+import sqlite3
+import logging
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS repositories_path ON repositories (path);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class SQLiteRegistry(object):
+    """SQLite storage for the repositories and the settings
+
+    Every change is written immediately and only the changed rows are touched, so there is no need to load or save the
+    whole registry.
+
+    Args:
+        path (str): the database file path
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.__connection = None
+        self.__settings = {}
+
+    @property
+    def connection(self):
+        if self.__connection is None:
+            self.__connection = sqlite3.connect(self.path)
+            self.__connection.executescript(SCHEMA)
+        return self.__connection
+
+    def load_settings(self):
+        """
+        Returns:
+            dict: setting name -> value
+        """
+        self.__settings = {name: value for name, value in self.connection.execute("SELECT name, value FROM settings")}
+        return {name: json.loads(value) for name, value in self.__settings.items()}
+
+    def save_settings(self, settings):
+        """Save the changed settings only
+
+        Args:
+            settings (dict): setting name -> value
+        """
+        changed = []
+        for name, value in settings.items():
+            raw = json.dumps(value, sort_keys = True)
+            if self.__settings.get(name) != raw:
+                changed.append((name, raw))
+                self.__settings[name] = raw
+
+        if not len(changed):
+            return
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO settings VALUES (?, ?)", changed)
+
+        logger.debug("Settings saved to '%s': %s", self.path, [name for name, raw in changed])
+
+    def create_repositories(self, repo_factory):
+        return SQLiteRepositoryRegistry(self, repo_factory)
+
+class RepositoryRegistry(MutableMapping):
+    """Repository name -> Repository mapping
+
+    Only the raw (path, type) entries are stored, the Repository objects are created on access and cached, so a
+    command which uses only a few repositories does not pay for all of them.
+
+    Args:
+        repo_factory (RepositoryFactory): creates the Repository objects
+        entries (dict): name -> (path, type)
+    """
+
+    def __init__(self, repo_factory, entries = None):
+        self.repo_factory = repo_factory
+        self.entries = {} if entries is None else entries
+        self.cache = {}
+
+    def get_entry(self, name):
+        """
+        Returns:
+            tuple: (path, type) or None
+        """
+        return self.entries.get(name)
+
+    def set_entries(self, entries):
+        """
+        Args:
+            entries: iterable of (name, path, type)
+        """
+        for name, path, type in entries:
+            self.entries[name] = (path, type)
+
+    def delete_entry(self, name):
+        """
+        Returns:
+            bool: False if the repository is unknown
+        """
+        return self.entries.pop(name, None) is not None
+
+    def change_entries(self, removals, entries):
+        """Delete and set many entries at once
+
+        Args:
+            removals (list): names
+            entries: iterable of (name, path, type)
+        """
+        for name in removals:
+            self.delete_entry(name)
+        self.set_entries(entries)
+
+    def iter_entries(self):
+        """
+        Yields:
+            tuple: (name, path, type) sorted by name
+        """
+        for name in sorted(self.entries):
+            path, type = self.entries[name]
+            yield name, path, type
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            entry = self.get_entry(name)
+            if entry is None:
+                raise KeyError(name)
+            self.cache[name] = self.repo_factory.create(entry[0], entry[1], name)
+        return self.cache[name]
+
+    def __setitem__(self, name, repo):
+        self.set_entries([(name, repo.path, repo.type)])
+        self.cache[name] = repo
+
+    def __delitem__(self, name):
+        self.cache.pop(name, None)
+        if not self.delete_entry(name):
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return self.get_entry(name) is not None
+
+    def __iter__(self):
+        for name, path, type in self.iter_entries():
+            yield name
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, repositories):
+        """Store many repositories at once"""
+        self.set_entries([(name, repo.path, repo.type) for name, repo in repositories.items()])
+        self.cache.update(repositories)
+
+    def apply(self, removals, repositories):
+        """Remove and store many repositories at once, atomically if the storage supports it
+
+        Args:
+            removals (list): names of the repositories to remove
+            repositories (dict): name -> Repository to store
+        """
+        unknown = [name for name in removals if name not in self]
+        if len(unknown):
+            raise KeyError(', '.join(unknown))
+        for name in removals:
+            self.cache.pop(name, None)
+        self.change_entries(removals, [(name, repo.path, repo.type) for name, repo in repositories.items()])
+        self.cache.update(repositories)
+
+    def clear(self):
+        self.entries.clear()
+        self.cache.clear()
+
+    def find_by_path(self, path):
+        """
+        Returns:
+            Repository or None
+        """
+        for name, repo_path, type in self.iter_entries():
+            if repo_path == path:
+                return self[name]
+        return None
+
+    def get_data(self):
+        return {name: dict(path = path, name = name, type = type) for name, path, type in self.iter_entries()}
+
+class SQLiteRepositoryRegistry(RepositoryRegistry):
+    """Repository registry stored in the SQLiteRegistry, the entries are read by name (or by path) on demand"""
+
+    def __init__(self, registry, repo_factory):
+        super(SQLiteRepositoryRegistry, self).__init__(repo_factory)
+        self.registry = registry
+
+    @property
+    def connection(self):
+        return self.registry.connection
+
+    def get_entry(self, name):
+        return self.connection.execute("SELECT path, type FROM repositories WHERE name = ?", (name, )).fetchone()
+
+    def set_entries(self, entries):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO repositories VALUES (?, ?, ?)", entries)
+
+    def delete_entry(self, name):
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM repositories WHERE name = ?", (name, ))
+        return cursor.rowcount > 0
+
+    def change_entries(self, removals, entries):
+        # one transaction, so either all or none of the changes are stored
+        with self.connection:
+            self.connection.executemany("DELETE FROM repositories WHERE name = ?", [(name, ) for name in removals])
+            self.connection.executemany("INSERT OR REPLACE INTO repositories VALUES (?, ?, ?)", entries)
+
+    def iter_entries(self):
+        for row in self.connection.execute("SELECT name, path, type FROM repositories ORDER BY name"):
+            yield row
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM repositories").fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM repositories")
+        self.cache.clear()
+
+    def find_by_path(self, path):
+        row = self.connection.execute("SELECT name FROM repositories WHERE path = ?", (path, )).fetchone()
+        if row is None:
+            return None
+        return self[row[0]]
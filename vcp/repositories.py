@@ -1,18 +1,156 @@
+import os
+import re
+import shlex
 import logging
 from .repository import Repository, register_type
+from .exceptions import RepositoryException, RepositoryCommandException
+from .commit_feed import CommitRecord
+from .mirror_cache import LIVE_HEADS
 
 logger = logging.getLogger(__name__)
 
+COMMIT_SHA_PATTERN = re.compile('^[0-9a-f]{40}$')
+
+# the refspecs of one fetch, so the command line never exceeds the argument size limit
+TAG_FETCH_BATCH_SIZE = 500
+
+def parse_tag_refs(lines):
+    """Parse the 'git ls-remote --tags' or the 'git show-ref --tags' output
+
+    The peeled lines (<tag>^{}) are skipped, so the annotated tags are compared by the tag object sha.
+
+    Returns:
+        dict: tag name -> sha
+    """
+    tags = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) != 2:
+            continue
+        sha, ref = parts
+        if not ref.startswith('refs/tags/') or ref.endswith('^{}'):
+            continue
+        tags[ref[len('refs/tags/'):]] = sha
+    return tags
+
+def diff_tags(local_tags, remote_tags):
+    """
+    Returns:
+        tuple: sorted lists of the tags to delete (local only) and to fetch (missing or different)
+    """
+    to_delete = sorted(set(local_tags) - set(remote_tags))
+    to_fetch = sorted([tag for tag, sha in remote_tags.items() if local_tags.get(tag) != sha])
+    return to_delete, to_fetch
+
+def parse_numstat(lines):
+    """Parse the 'git diff --numstat' output, the binary files are counted with 0 insertions and deletions
+
+    Returns:
+        list: dicts with path, insertions and deletions keys
+    """
+    files = []
+    for line in lines:
+        parts = line.split('\t', 2)
+        if len(parts) != 3:
+            continue
+        insertions, deletions, path = parts
+        files.append(dict(
+            path = path,
+            insertions = int(insertions) if insertions.isdigit() else 0,
+            deletions = int(deletions) if deletions.isdigit() else 0,
+        ))
+    return files
+
 # TODO: refactor this to use GitPython
 @register_type('git')
 class GitRepository(Repository):
+    __slots__ = ()
+
+    def init(self, url, ref, clone = None):
+        """Clone the repository
+
+        Args:
+            url (str): the remote url
+            ref (str): branch, tag or commit to checkout
+            clone (dict): the clone strategy, the keys are optional:
+                filter (str): partial clone filter, eg. 'blob:none'
+                depth (int): shallow clone with this many commits
+                single_branch (bool): clone only the ref branch (or tag)
+        """
+        clone = clone or {}
+        options = []
+        if clone.get('filter'):
+            options.append("--filter={}".format(clone['filter']))
+        if clone.get('depth'):
+            options += ["--depth", str(int(clone['depth']))]
+        if clone.get('single_branch'):
+            options.append("--single-branch")
+
+        fetch_commit = False
+        if clone.get('depth') or clone.get('single_branch'):
+            # the history of the other branches is not cloned, so the ref must be cloned directly
+            if self.__is_remote_branch_or_tag(url, ref):
+                options += ["--branch", ref]
+            elif COMMIT_SHA_PATTERN.match(ref):
+                # 'git clone --branch' does not accept commits, it is fetched after the clone
+                fetch_commit = True
+            else:
+                raise RepositoryException("Ref '{}' of '{}' is neither a branch, a tag nor a full commit sha, it cannot be "
+                                          "cloned with depth or single_branch".format(ref, self.name))
+
+        if self.mirror_cache:
+            success, output = self.mirror_cache.update(url)
+            if success:
+                options += ["--reference-if-able", self.mirror_cache.get_path(url)]
+            else:
+                logger.warning("Cannot update the mirror of '%s': %s", url, output)
 
-    def init(self, url, ref):
         logger.info("Cloning repository '{}'".format(url))
-        res = self.cmd("git clone {} .".format(url))
-        res += self.cmd("git checkout {}".format(ref))
+        # the clone errors are mostly network errors, so the RepositoryCommandException marks them as transient
+        res = self.cmd(['git', 'clone'] + options + [url, '.'], raise_on_error = True)
+        if fetch_commit:
+            depth = ["--depth", str(int(clone['depth']))] if clone.get('depth') else []
+            res += self.cmd(['git', 'fetch'] + depth + ['origin', ref], raise_on_error = True)
+        res += self.cmd(['git', 'checkout', ref])
+        if self.last_returncode != 0:
+            raise RepositoryException("Cannot checkout '{}' in '{}': {}".format(ref, self.name, res))
         return res
 
+    def __is_remote_branch_or_tag(self, url, ref):
+        command = ['git', 'ls-remote', '--heads', '--tags', url, ref]
+        output = self.cmd(command)
+        if self.last_returncode != 0:
+            raise RepositoryCommandException(self.last_returncode, ' '.join(command), output)
+        refs = set([line.split('\t', 1)[1] for line in output.splitlines() if '\t' in line])
+        return ref in refs or 'refs/heads/' + ref in refs or 'refs/tags/' + ref in refs
+
+    def add_worktree(self, path, ref):
+        """Create a new worktree of the repository, it shares the object storage with this one"""
+        res = self.cmd(['git', 'worktree', 'add', path, ref])
+        if self.last_returncode != 0:
+            # the branch is checked out in an other worktree already
+            logger.warning("Cannot checkout '%s' in the worktree '%s', use detached HEAD", ref, path)
+            res = self.cmd(['git', 'worktree', 'add', '--detach', path, ref], raise_on_error = True)
+        return res
+
+    def remove_worktree(self, path):
+        return self.cmd(['git', 'worktree', 'remove', '--force', path])
+
+    def is_shallow(self):
+        return os.path.isfile(os.path.join(self.git_dir, 'shallow'))
+
+    def ensure_history(self):
+        """Fetch the missing history of the shallow clones, the partial clones fetch the missing objects by themselves
+
+        Returns:
+            bool: True if the history has been fetched
+        """
+        if not self.is_shallow():
+            return False
+        logger.info("Fetch the full history of '%s'", self.name)
+        self.cmd("git fetch --unshallow", raise_on_error = True)
+        return True
+
     def __get_current_remote(self):
         return self.cmd("git remote").strip()
 
@@ -21,14 +159,22 @@ class GitRepository(Repository):
         branch = self.cmd("git rev-parse --abbrev-ref HEAD").strip()
         return "{}/{}".format(remote, branch)
 
-    def diff(self):
-        return self.cmd("git --no-pager diff")
+    def diff(self, paths = None):
+        if not paths:
+            return self.cmd("git --no-pager diff")
+        return self.cmd("git --no-pager diff -- {}".format(' '.join([shlex.quote(path) for path in paths])))
+
+    def get_diff_numstat(self):
+        return parse_numstat(self.list_cmd("git --no-pager diff --numstat"))
+
+    def get_unpushed_tags(self):
+        tag_cmd = "git show-ref --tags | grep -v -F \"$(git ls-remote --tags %s| grep -v '\\^{}' | cut -f 2)\"" % self.__get_current_remote()
+        return [t.split('/')[-1:][0] for t in self.list_cmd(tag_cmd)]
 
     def pushables(self, remote):
         if remote is None:
             remote = self.__get_current_full_branch_name()
-        tag_cmd = "git show-ref --tags | grep -v -F \"$(git ls-remote --tags %s| grep -v '\\^{}' | cut -f 2)\"" % self.__get_current_remote()
-        return self.list_cmd("git --no-pager log --oneline %s..HEAD" % remote) + [t.split('/')[-1:][0] for t in self.list_cmd(tag_cmd)]
+        return self.list_cmd("git --no-pager log --oneline %s..HEAD" % remote) + self.get_unpushed_tags()
 
     def get_commits_from_last_tag(self):
         tag = self.cmd("git describe --abbrev=0 --tags").strip()
@@ -42,20 +188,153 @@ class GitRepository(Repository):
         return self.cmd("git pull --rebase")
 
     def fetch(self):
+        if self.mirror_cache:
+            remote = self.__get_current_remote()
+            url = self.cmd("git remote get-url {}".format(remote)).strip()
+            if self.last_returncode == 0 and self.mirror_cache.exists(url):
+                # the mirror is shared by all the workspaces, so only the first fetch needs the network
+                success, output = self.mirror_cache.update(url)
+                if success:
+                    mirror = self.mirror_cache.get_path(url)
+                    # only the remote tracking branches are pruned (by the current branches of the remote), the tags
+                    # are fetched by the default tag following, so the local only tags are kept
+                    return self.cmd(['git', 'fetch', '--prune', mirror, '+{}*:refs/remotes/{}/*'.format(LIVE_HEADS, remote)])
+                logger.warning("Cannot update the mirror of '%s': %s", url, output)
         return self.cmd("git fetch")
 
+    def get_upstream_divergence(self):
+        """Compare the HEAD with its upstream (without fetch)
+
+        Returns:
+            tuple: (ahead, behind) commit counts or None if there is no upstream
+        """
+        res = self.cmd("git rev-list --left-right --count HEAD...@{u}").split()
+        if self.last_returncode != 0 or len(res) != 2:
+            return None
+        return int(res[0]), int(res[1])
+
+    def rebase(self):
+        """Rebase the current branch to its upstream, without fetch"""
+        logger.info("Rebasing repository '%s'...", self.name)
+        return self.cmd("git rebase @{u}", raise_on_error = True)
+
+    @property
+    def git_dir(self):
+        git_dir = os.path.join(self.path, '.git')
+        if os.path.isfile(git_dir):
+            # worktrees and submodules: 'gitdir: <path>'
+            with open(git_dir) as f:
+                git_dir = os.path.join(self.path, f.read().strip()[len('gitdir: '):])
+        return git_dir
+
+    def get_meta_filename(self, name):
+        return os.path.join(self.git_dir, 'vcp_' + name)
+
     def status(self):
         return self.cmd("git status")
 
     def reset(self):
-        return self.cmd("git reset --hard %s" % self.__get_current_full_branch_name()) + '\n' + \
-               self.cmd("git tag -l | xargs git tag -d") + '\n' + \
-               self.cmd("git fetch -t")
+        return self.cmd("git reset --hard %s" % self.__get_current_full_branch_name()) + '\n' + self.reset_tags()
+
+    def reset_tags(self):
+        """Make the local tags the same as the remote ones: delete the local only tags in one transaction and fetch
+        the missing and the different ones in batches"""
+        remote = self.__get_current_remote()
+        command = ['git', 'ls-remote', '--tags', remote]
+        remote_tags = parse_tag_refs(self.cmd(command).splitlines())
+        if self.last_returncode != 0:
+            raise RepositoryCommandException(self.last_returncode, ' '.join(command), '')
+        local_tags = parse_tag_refs(self.cmd(['git', 'show-ref', '--tags']).splitlines())
+
+        to_delete, to_fetch = diff_tags(local_tags, remote_tags)
+
+        # the tag names come from the remote, so they are never passed through a shell
+        res = ''
+        if len(to_delete):
+            res += self.cmd(['git', 'update-ref', '--stdin'], input = ''.join(["delete refs/tags/{}\n".format(tag) for tag in to_delete]))
+        for idx in range(0, len(to_fetch), TAG_FETCH_BATCH_SIZE):
+            refspecs = ["+refs/tags/{0}:refs/tags/{0}".format(tag) for tag in to_fetch[idx:idx + TAG_FETCH_BATCH_SIZE]]
+            res += self.cmd(['git', 'fetch', '--no-tags', remote] + refspecs)
+
+        logger.debug("Tags of '%s': %d deleted, %d fetched", self.name, len(to_delete), len(to_fetch))
+        return res
 
     def get_own_commits_since(self, since_str):
         user = self.cmd("git config --get user.name").strip()
         return self.cmd("git --no-pager log --oneline --author='{}' --since='{}'".format(user, since_str))
 
+    def iter_own_commits_since(self, since_str):
+        """Stream the own commits in chronological order
+
+        Yields:
+            CommitRecord
+        """
+        user = self.cmd("git config --get user.name").strip()
+        command = "git --no-pager log --reverse --author-date-order --author='{}' --since='{}' --format='%H%x09%at%x09%an%x09%s'".format(user, since_str)
+        for line in self.iter_cmd(command):
+            sha, time, author, subject = line.split("\t", 3)
+            yield CommitRecord(int(time), self, sha, author, subject)
+
+    def get_refs(self):
+        """Get the HEAD and all the refs, the annotated tags are dereferenced to the commit
+
+        Returns:
+            dict: ref name -> sha
+        """
+        refs = {}
+        for line in self.list_cmd("git show-ref --head --dereference"):
+            sha, _, ref = line.partition(' ')
+            if ref.endswith('^{}'):
+                ref = ref[:-3]
+            refs[ref] = sha
+        return refs
+
+    def get_head_names(self):
+        """Get the full name of the current branch and its upstream (None if the HEAD is detached or there is no upstream)"""
+        head = self.cmd("git symbolic-ref -q HEAD").strip() or None
+        upstream = self.cmd("git rev-parse --symbolic-full-name @{u}").strip()
+        if self.last_returncode != 0 or not upstream:
+            upstream = None
+        return head, upstream
+
+    def get_head_sha(self):
+        """Get the sha of the HEAD, read it from the git dir if it is possible to spare the process start"""
+        git_dir = os.path.join(self.path, '.git')
+        try:
+            with open(os.path.join(git_dir, 'HEAD')) as f:
+                head = f.read().strip()
+            if not head.startswith('ref: '):
+                return head
+            ref = head[5:]
+            ref_path = os.path.join(git_dir, ref)
+            if os.path.isfile(ref_path):
+                with open(ref_path) as f:
+                    return f.read().strip()
+            with open(os.path.join(git_dir, 'packed-refs')) as f:
+                for line in f:
+                    if line.rstrip().endswith(' ' + ref):
+                        return line.split(' ')[0]
+        except (IOError, OSError):
+            # worktrees, submodules, etc
+            pass
+        return self.cmd("git rev-parse HEAD").strip()
+
+    def get_user_name(self):
+        return self.cmd("git config --get user.name").strip()
+
+    def iter_commits(self, include, exclude):
+        """Stream the commits reachable from the include refs but not from the exclude refs, the oldest first
+
+        Yields:
+            tuple: sha, parent shas, author, author time, subject
+        """
+        # there may be thousands of refs, so they are passed on the stdin instead of the command line
+        command = ['git', '--no-pager', 'log', '--reverse', '--format=%H%x09%P%x09%an%x09%at%x09%s', '--ignore-missing', '--stdin']
+        revisions = list(include) + ['^' + sha for sha in exclude]
+        for line in self.iter_cmd(command, input = ''.join([rev + "\n" for rev in revisions])):
+            sha, parents, author, time, subject = line.split("\t", 4)
+            yield sha, parents.split(), author, int(time), subject
+
     def get_dirty_files(self):
         files = []
         for file in self.list_cmd("git status --short"):
@@ -66,6 +345,17 @@ class GitRepository(Repository):
     def get_untracked_files(self):
         return self.list_cmd("git ls-files --others --exclude-standard")
 
+    def is_at_ref(self, ref):
+        """Check the HEAD is at the ref already: the ref is the current branch or the detached HEAD is at the ref commit"""
+        try:
+            with open(os.path.join(self.git_dir, 'HEAD')) as f:
+                head = f.read().strip()
+        except (IOError, OSError):
+            head = self.cmd("git rev-parse HEAD").strip()
+        if head.startswith('ref: '):
+            return head[len('ref: '):] == 'refs/heads/' + ref
+        return self.cmd("git rev-parse --verify -q {}^{{commit}}".format(ref)).strip() == head
+
     def set_ref(self, ref):
         logger.debug("Set ref {} for repo {}".format(ref, self.name))
         return self.cmd("git checkout {}".format(ref))
@@ -1,7 +1,7 @@
 
 import os
 import pty
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, list2cmdline
 from abc import ABCMeta, abstractmethod
 import logging
 
@@ -18,9 +18,13 @@ def register_type(type_name):
 class RepositoryFactory(object):
     types = {}
 
+    def __init__(self):
+        # the MirrorCache instance if the mirrors are enabled
+        self.mirror_cache = None
+
     def create(self, path, type, name):
-        repo = self.types[type](path, name)
-        repo.type = type
+        repo = self.types[type](path, name, type)
+        repo.mirror_cache = self.mirror_cache
         return repo
 
 def num_bytes_readable(fd):
@@ -33,10 +37,15 @@ def num_bytes_readable(fd):
     return buf[0]
 
 class Repository(object, metaclass=ABCMeta):
-    def __init__(self, path, name):
+    # there may be lots of repository instances, so they are kept compact
+    __slots__ = ('path', 'name', 'type', 'last_returncode', 'mirror_cache')
+
+    def __init__(self, path, name, type = None):
         self.path = path
         self.name = name
-        self.type = None
+        self.type = type
+        self.last_returncode = None
+        self.mirror_cache = None
 
     def list_cmd(self, command):
         return self.cmd(command).split("\n")[:-1]
@@ -52,25 +61,84 @@ class Repository(object, metaclass=ABCMeta):
     #         raise RepositoryCommandException(p.returncode, command, os.read(master, num_bytes_readable(master)))
     #     return os.read(master, num_bytes_readable(master))
 
-    def cmd(self, command, raise_on_error = False):
+    def cmd(self, command, raise_on_error = False, input = None):
+        """Execute the command in the repository folder
+
+        Args:
+            command (str|list): a shell command line, or an argument list which is executed without shell
+            raise_on_error (bool): raise RepositoryCommandException if the command fails
+            input (str): written to the stdin of the command
+        """
         from subprocess import STDOUT
         logger.debug("Execute command: '%s' in '%s'", command, self.path)
-        p = Popen(command, shell = True, cwd = self.path, stdout = PIPE, stderr = STDOUT)
-        stdout, _ = p.communicate()
+        p = Popen(command, shell = isinstance(command, str), cwd = self.path, stdin = None if input is None else PIPE,
+                  stdout = PIPE, stderr = STDOUT)
+        stdout, _ = p.communicate(None if input is None else input.encode())
+        self.last_returncode = p.returncode
         if p.returncode != 0 and raise_on_error:
-            raise RepositoryCommandException(p.returncode, command, stdout)
+            raise RepositoryCommandException(p.returncode, command if isinstance(command, str) else list2cmdline(command), stdout)
         return stdout.decode()
 
+    def iter_cmd(self, command, input = None):
+        """Execute the command and yield the output lines as soon as they are arrived
+
+        Args:
+            command (str|list): see cmd
+            input (str): written to the stdin of the command before the output is read, so the command must read all
+                of its input before it starts to write (eg. 'git log --stdin')
+        """
+        logger.debug("Execute command: '%s' in '%s'", command, self.path)
+        p = Popen(command, shell = isinstance(command, str), cwd = self.path, stdin = None if input is None else PIPE,
+                  stdout = PIPE, universal_newlines = True)
+        if input is not None:
+            p.stdin.write(input)
+            p.stdin.close()
+        try:
+            for line in p.stdout:
+                yield line.rstrip("\n")
+        finally:
+            p.stdout.close()
+            self.last_returncode = p.wait()
+
     @abstractmethod
     def set_ref(self, ref):
         pass
 
     @abstractmethod
-    def init(self, url):
+    def is_at_ref(self, ref):
+        pass
+
+    @abstractmethod
+    def init(self, url, ref, clone = None):
         pass
 
     @abstractmethod
-    def diff(self):
+    def add_worktree(self, path, ref):
+        pass
+
+    @abstractmethod
+    def remove_worktree(self, path):
+        pass
+
+    @abstractmethod
+    def ensure_history(self):
+        """Get the full history if the repository is cloned partially"""
+        pass
+
+    @abstractmethod
+    def diff(self, paths = None):
+        """
+        Args:
+            paths (list): limit the diff to these paths
+        """
+        pass
+
+    @abstractmethod
+    def get_diff_numstat(self):
+        """
+        Returns:
+            list: the changed files, see parse_numstat
+        """
         pass
 
     @abstractmethod
@@ -81,6 +149,19 @@ class Repository(object, metaclass=ABCMeta):
     def fetch(self):
         pass
 
+    @abstractmethod
+    def get_upstream_divergence(self):
+        pass
+
+    @abstractmethod
+    def rebase(self):
+        pass
+
+    @abstractmethod
+    def get_meta_filename(self, name):
+        """Path of a vcp specific file which is stored in the repository metadata (eg. in .git)"""
+        pass
+
     @abstractmethod
     def pushables(self, remote):
         pass
@@ -101,10 +182,14 @@ class Repository(object, metaclass=ABCMeta):
     def get_own_commits_since(self, since_str):
         pass
 
+    @abstractmethod
+    def iter_own_commits_since(self, since_str):
+        pass
+
     def __repr__(self):
-        return "<Repository: %s>" % self.__dict__()
+        return "<Repository: %s>" % self.get_data()
 
-    def __dict__(self):
+    def get_data(self):
         return dict(
             path = self.path,
             name = self.name,
@@ -0,0 +1,115 @@
+import os
+import json
+import logging
+from collections import OrderedDict
+
+from .exceptions import RepositoryException
+
+logger = logging.getLogger(__name__)
+
+class RepositoryBatch(object):
+    """Collects repository additions and removals and applies them at once
+
+    All the changes are validated before anything is modified, and the config is saved only once.
+    If any of the changes is invalid, none of them are applied.
+
+    Args:
+        vcp (VCP): the vcp instance
+    """
+
+    def __init__(self, vcp):
+        self.vcp = vcp
+        self.additions = OrderedDict()
+        self.removals = []
+        self.errors = []
+
+    def add(self, path, type = 'git', name = None):
+        path = os.path.abspath(os.path.expanduser(path))
+        if name is None:
+            name = os.path.basename(path.rstrip(os.sep))
+        if name in self.additions:
+            self.errors.append("Repository '{}' is added twice".format(name))
+        self.additions[name] = (path, type)
+
+    def remove(self, name):
+        if name in self.removals:
+            self.errors.append("Repository '{}' is removed twice".format(name))
+        self.removals.append(name)
+
+    def add_from_data(self, data):
+        """Add repositories from deserialized data
+
+        Args:
+            data: list of dicts with 'path' and the optional 'name' and 'type' keys, or dict of name -> dict (as in
+                  the 'repositories' config node)
+        """
+        if isinstance(data, dict):
+            data = [dict(item, name = name) for name, item in data.items()]
+        for item in data:
+            if not isinstance(item, dict) or 'path' not in item:
+                self.errors.append("Invalid repository entry: {}".format(item))
+                continue
+            self.add(item['path'], item.get('type', 'git'), item.get('name'))
+
+    def add_from_text(self, text):
+        """Add repositories from text: json (see add_from_data), ndjson or a path per line"""
+        text = text.strip()
+        if text.startswith('[') or text.startswith('{'):
+            try:
+                self.add_from_data(json.loads(text))
+                return
+            except ValueError:
+                pass
+        for line in text.splitlines():
+            line = line.strip()
+            if not len(line):
+                continue
+            if line.startswith('{'):
+                try:
+                    self.add_from_data([json.loads(line)])
+                except ValueError:
+                    self.errors.append("Invalid json line: {}".format(line))
+            else:
+                self.add(line)
+
+    def validate(self):
+        """
+        Returns:
+            list of error messages
+        """
+        errors = list(self.errors)
+
+        for name in self.removals:
+            if name not in self.vcp.repositories:
+                errors.append("Unknown repository: '{}'".format(name))
+
+        for name, (path, type) in self.additions.items():
+            if not os.path.isdir(path):
+                errors.append("Path '{}' is not exists".format(path))
+            if type not in self.vcp.repo_factory.types:
+                errors.append("Unknown repository type '{}' for '{}'".format(type, name))
+            if name in self.vcp.repositories and name not in self.removals:
+                errors.append("Repository '{}' is already exists".format(name))
+
+        return errors
+
+    def apply(self):
+        """Validate and apply all the changes
+
+        Raises:
+            RepositoryException: if any of the changes is invalid
+        """
+        errors = self.validate()
+        if len(errors):
+            raise RepositoryException("The batch is rejected:\n" + "\n".join(errors))
+
+        additions = OrderedDict([(name, self.vcp.repo_factory.create(path, type, name)) for name, (path, type) in self.additions.items()])
+        self.vcp.repositories.apply(self.removals, additions)
+
+        if self.vcp.commit_index:
+            for name in self.removals:
+                self.vcp.commit_index.remove(name)
+
+        self.vcp.save_config()
+
+        logger.debug("Repository batch applied, added: %s, removed: %s", list(self.additions.keys()), self.removals)
@@ -1,12 +1,28 @@
+from collections import OrderedDict
 
 from .box import Box
 
 class RepositoryCommandResultBox(Box):
-    def __init__(self, repository, content):
+    def __init__(self, repository, content, command = None, payload = None, returncode = None, duration = None):
         self.repository = repository
-        caption = '%(name)s: %(path)s' % repository.__dict__()
+        self.command = command
+        self.payload = content if payload is None else payload
+        self.returncode = returncode
+        self.duration = duration
+        caption = '%s: %s' % (repository.name, repository.path)
         super(RepositoryCommandResultBox, self).__init__(caption, content)
 
     def reconfig(self, data):
         if data['show_repo_path'] is False:
             self.caption = self.repository.name
+
+    @property
+    def data(self):
+        return OrderedDict([
+            ('repo', self.repository.name),
+            ('path', self.repository.path),
+            ('command', self.command),
+            ('exit_status', self.returncode),
+            ('duration', self.duration),
+            ('payload', self.payload),
+        ])
@@ -0,0 +1,111 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# never descend into these directories
+PRUNED_DIRS = set(['.git', '.hg', '.svn', 'node_modules', 'bower_components', '__pycache__', '.tox', '.nox', '.venv', 'venv', '.virtualenvs'])
+
+class RepositoryScanner(object):
+    """Search git repositories and worktrees in a directory tree
+
+    The directories are read with os.scandir in a thread pool. The found repositories are descended into (they may
+    contain nested, independent repositories), except their submodules.
+
+    Args:
+        workers (int): number of threads
+    """
+
+    def __init__(self, workers = 16):
+        self.workers = workers
+        # the submodule paths of the found repositories
+        self.excluded = set()
+
+    def scan_dir(self, path):
+        """Scan one directory
+
+        Returns:
+            tuple: (path, type of the repository or None, list of subdirectories to scan)
+        """
+        subdirs = []
+        if path in self.excluded:
+            return path, None, subdirs
+        try:
+            entries = list(os.scandir(path))
+        except OSError as e:
+            logger.debug("Cannot read '%s': %s", path, e)
+            return path, None, subdirs
+
+        type = None
+        names = set()
+        for entry in entries:
+            names.add(entry.name)
+            if entry.name != '.git':
+                continue
+            if entry.is_dir(follow_symlinks = False):
+                type = 'repository'
+            elif entry.is_file(follow_symlinks = False):
+                type = self.get_git_file_type(entry.path)
+
+        # the submodules are the part of their parent repository
+        if type == 'submodule':
+            return path, type, subdirs
+
+        if type is not None and '.gitmodules' in names:
+            self.excluded.update(self.get_submodule_paths(path))
+
+        # virtualenv
+        if 'pyvenv.cfg' in names:
+            return path, type, subdirs
+
+        for entry in entries:
+            if entry.name in PRUNED_DIRS or not entry.is_dir(follow_symlinks = False):
+                continue
+            subdirs.append(entry.path)
+
+        return path, type, subdirs
+
+    def get_submodule_paths(self, path):
+        """
+        Returns:
+            list: the absolute paths of the submodules listed in the .gitmodules of the repository
+        """
+        paths = []
+        try:
+            with open(os.path.join(path, '.gitmodules')) as f:
+                for line in f:
+                    key, sep, value = line.partition('=')
+                    if sep and key.strip() == 'path':
+                        paths.append(os.path.normpath(os.path.join(path, value.strip())))
+        except IOError:
+            pass
+        return paths
+
+    def get_git_file_type(self, path):
+        """The '.git' file points to the real git dir, it can be a worktree or a submodule"""
+        try:
+            with open(path) as f:
+                gitdir = f.read().strip()
+        except IOError:
+            return None
+        if not gitdir.startswith('gitdir:'):
+            return None
+        return 'worktree' if os.sep + 'worktrees' + os.sep in gitdir else 'submodule'
+
+    def scan(self, root):
+        """
+        Returns:
+            list of (path, type) tuples, where type is 'repository', 'worktree' or 'submodule'
+        """
+        found = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending = set([executor.submit(self.scan_dir, os.path.abspath(root))])
+            while pending:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    path, type, subdirs = future.result()
+                    if type:
+                        found.append((path, type))
+                    pending.update([executor.submit(self.scan_dir, subdir) for subdir in subdirs])
+        return sorted(found)
@@ -1,7 +1,8 @@
 import os
 import re
+import shutil
 import logging
-from subprocess import check_call, check_output, CalledProcessError, PIPE
+from subprocess import check_call, check_output, CalledProcessError, Popen, PIPE
 from abc import ABCMeta, abstractmethod, abstractproperty
 import platform
 
@@ -17,18 +18,101 @@ def register(name, determiner):
         return cls
     return wrapper
 
+def parse_os_release(content):
+    """Parse the os-release file content (see man os-release)
+
+    Returns:
+        dict: variable name -> value
+    """
+    data = {}
+    for line in content.splitlines():
+        line = line.strip()
+        if not len(line) or line.startswith('#') or '=' not in line:
+            continue
+        name, value = line.split('=', 1)
+        data[name] = value.strip().strip('"\'')
+    return data
+
 class SystemPackageManagerHandlerFactory(object):
     types = {}
 
-    def create(self):
+    os_release_filename = '/etc/os-release'
+
+    def __init__(self):
+        self.__os_release = None
+
+    @property
+    def os_release(self):
+        """The parsed os-release file or an empty dict if the file is not exists"""
+        if self.__os_release is None:
+            try:
+                with open(self.os_release_filename) as f:
+                    self.__os_release = parse_os_release(f.read())
+            except (IOError, OSError):
+                self.__os_release = {}
+        return self.__os_release
+
+    def get_current(self):
+        """
+        Returns:
+            str: the distro id (eg. 'debian') or None if it cannot be determined
+        """
+        return self.os_release.get('ID')
+
+    def get_current_family(self):
+        """
+        Returns:
+            list: the distro id and the ids of the distros it is derived from (eg. ['ubuntu', 'debian'])
+        """
+        ids = [self.get_current()] + self.os_release.get('ID_LIKE', '').split()
+        return [id for id in ids if id]
+
+    def detect(self):
+        """
+        Returns:
+            str: the name of the handler for the current system or None
+        """
         for name, cls in list(self.types.items()):
-            if cls.determiner.test():
-                return self.types[name]()
-
-        raise SystemPackageManagerHandlerException("Cannot determine the current system distro name.")
+            if cls.determiner.test(self):
+                return name
+        return None
+
+    def create(self, name = None):
+        """Create the handler
+
+        Args:
+            name (str): the handler name, if None it will be detected
+        """
+        if name is None:
+            name = self.detect()
+            if name is None:
+                raise SystemPackageManagerHandlerException("Cannot determine the current system distro name.")
+            logger.debug("System package manager detected: %s", name)
+
+        if name not in self.types:
+            raise SystemPackageManagerHandlerException("Unknown system package manager: '{}'".format(name))
+
+        return self.types[name]()
+
+def query_packages(command):
+    """Run a package query command which returns 1 if any of the packages is not installed
+
+    Returns:
+        str: the stdout
+    """
+    logger.debug("Query packages: %s", command)
+    p = Popen(command, stdout = PIPE, stderr = PIPE, universal_newlines = True)
+    stdout, stderr = p.communicate()
+    if p.returncode not in (0, 1):
+        raise CalledProcessError(p.returncode, command, stderr)
+    return stdout
 
 class SystemPackageManagerHandlerHandlerBase(object, metaclass=ABCMeta):
 
+    def __init__(self):
+        # package name -> installed, shared between all the projects of the run
+        self.installed_packages = {}
+
     def get_system_dependencies(self, project):
         if self.name not in project.system_dependencies:
             return []
@@ -36,16 +120,42 @@ class SystemPackageManagerHandlerHandlerBase(object, metaclass=ABCMeta):
 
     def get_not_installed_packages(self, project):
         names = self.get_system_dependencies(project)
-        return [name for name in names if not self.is_package_installed(name)]
+        self.check_packages(names)
+        return [name for name in names if not self.installed_packages[name]]
+
+    def check_packages(self, names):
+        """Query the unknown packages at once and cache the result"""
+        unknown = [name for name in names if name not in self.installed_packages]
+        if not len(unknown):
+            return
+        installed = self.get_installed_packages(unknown)
+        for name in unknown:
+            self.installed_packages[name] = name in installed
 
-    @abstractmethod
     def is_package_installed(self, name):
+        self.check_packages([name])
+        return self.installed_packages[name]
+
+    @abstractmethod
+    def get_installed_packages(self, names):
+        """
+        Args:
+            names (list): package names
+
+        Returns:
+            set: the installed ones from the names
+        """
         pass
 
+    @staticmethod
+    def parse_name_version_lines(output):
+        """Parse the 'name version' lines of the pacman and brew outputs"""
+        return set([line.split()[0] for line in output.splitlines() if len(line.strip())])
+
 class DeterminerBase(object, metaclass=ABCMeta):
 
     @abstractmethod
-    def test(self):
+    def test(self, factory):
         pass
 
 class LinuxDeterminer(DeterminerBase):
@@ -53,62 +163,44 @@ class LinuxDeterminer(DeterminerBase):
     def __init__(self, *distro_names):
         self._names = distro_names
 
-    def test(self):
-        distro_name = platform.linux_distribution()[0].lower()
-        return distro_name in self._names
+    def test(self, factory):
+        return len(set(self._names) & set(factory.get_current_family())) > 0
 
 class MaxOSDeterminer(DeterminerBase):
 
     def __init__(self, pkg_mgr):
         self._pkg_mgr = pkg_mgr
 
-    def test(self):
-        mac_ver = platform.mac_ver()
-        # not mac
-        if len(mac_ver[0]) < 2:
+    def test(self, factory):
+        if platform.system() != 'Darwin':
             return False
 
-        try:
-            check_call(['which', self._pkg_mgr], stdout = PIPE, stderr = PIPE)
-            return True
-        except CalledProcessError:
-            return False
+        return shutil.which(self._pkg_mgr) is not None
 
 @register('brew', MaxOSDeterminer('brew'))
 class BrewHandler(SystemPackageManagerHandlerHandlerBase):
 
-    def is_package_installed(self, name):
-        try:
-            check_call(['brew', 'ls', '--versions', name], stdout = PIPE, stderr = PIPE)
-            return True
-        except CalledProcessError as e:
-            if e.returncode == 1:
-                return False
-            else:
-                raise
+    def get_installed_packages(self, names):
+        return self.parse_name_version_lines(query_packages(['brew', 'ls', '--versions'] + names))
 
 @register('dpkg', LinuxDeterminer('debian', 'ubuntu', 'linuxmint'))
 class DPKGHandler(SystemPackageManagerHandlerHandlerBase):
 
-    def is_package_installed(self, name):
-        try:
-            check_call(['dpkg', '-s', name], stdout = PIPE, stderr = PIPE)
-            return True
-        except CalledProcessError as e:
-            if e.returncode == 1:
-                return False
-            else:
-                raise
+    def get_installed_packages(self, names):
+        return self.parse_dpkg_query(query_packages(['dpkg-query', '-W', '-f', '${Package}\\t${Status}\\n'] + names))
+
+    @staticmethod
+    def parse_dpkg_query(output):
+        installed = set()
+        for line in output.splitlines():
+            name, _, status = line.partition("\t")
+            # eg. 'deinstall ok config-files' means removed, 'hold ok installed' is installed
+            if status.split()[-1:] == ['installed']:
+                installed.add(name)
+        return installed
 
 @register('pacman', LinuxDeterminer('arch'))
 class PacManHandler(SystemPackageManagerHandlerHandlerBase):
 
-    def is_package_installed(self, name):
-        try:
-            check_call(['pacman', '-Qi', name], stdout = PIPE, stderr = PIPE)
-            return True
-        except CalledProcessError as e:
-            if e.returncode == 1:
-                return False
-            else:
-                raise
+    def get_installed_packages(self, names):
+        return self.parse_name_version_lines(query_packages(['pacman', '-Q'] + names))
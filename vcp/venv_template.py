@@ -0,0 +1,140 @@
+import os
+import errno
+import hashlib
+import shutil
+import logging
+import tempfile
+from subprocess import check_call, check_output, CalledProcessError
+
+from .exceptions import PythonEnvironmentException
+
+logger = logging.getLogger(__name__)
+
+# increase it when the template content changes, so the old templates will not be used
+TEMPLATE_VERSION = 1
+
+# these files may contain the absolute path of the environment
+RELOCATABLE_DIRS = ['bin', 'Scripts']
+RELOCATABLE_FILES = ['pyvenv.cfg']
+
+ORIGIN_FILENAME = '.vcp_template_origin'
+
+class VenvTemplate(object):
+    """Shared base python virtual environment, built once per interpreter version
+
+    The project environments are cloned from it: the files are hard linked, except the ones which contain the path
+    of the template (the scripts in the bin folder and the pyvenv.cfg), those are copied and relocated to the new path.
+
+    Args:
+        base_dir (str): the folder of the templates
+        interpreter (str): the python interpreter (name or path), eg. 'python3' or '/usr/bin/python3.6'
+        with_pip (bool): install pip into the template
+    """
+
+    def __init__(self, base_dir, interpreter = 'python3', with_pip = True):
+        self.base_dir = base_dir
+        self.interpreter = interpreter
+        self.with_pip = with_pip
+        self.__path = None
+
+    @property
+    def path(self):
+        if self.__path is None:
+            try:
+                info = check_output([self.interpreter, '-c', 'import os, sys; print(sys.version.split()[0], os.path.realpath(sys.executable))'],
+                                    universal_newlines = True)
+            except (OSError, CalledProcessError) as e:
+                raise PythonEnvironmentException("Python interpreter '{}' is not available: {}".format(self.interpreter, e))
+            version, executable = info.strip().split(' ', 1)
+            # the same version may be installed to more places
+            executable_hash = hashlib.sha1(executable.encode()).hexdigest()[:8]
+            name = '{}-{}-{}-v{}'.format(os.path.basename(self.interpreter), version, executable_hash, TEMPLATE_VERSION)
+            self.__path = os.path.join(self.base_dir, name)
+        return self.__path
+
+    def ensure(self):
+        """Build the template if it does not exist yet"""
+        if os.path.isdir(self.path):
+            return
+
+        if not os.path.isdir(self.base_dir):
+            os.makedirs(self.base_dir)
+
+        logger.info("Create python environment template '%s'", self.path)
+
+        # build it in a temporary folder, so the half ready template never will be used
+        build_path = tempfile.mkdtemp(dir = self.base_dir, prefix = '.build-')
+        try:
+            command = [self.interpreter, '-m', 'venv']
+            if not self.with_pip:
+                command.append('--without-pip')
+            check_call(command + [build_path])
+            with open(os.path.join(build_path, ORIGIN_FILENAME), 'w') as f:
+                f.write(build_path)
+            os.rename(build_path, self.path)
+        except OSError as e:
+            shutil.rmtree(build_path)
+            # an other process was faster
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                raise
+        except:
+            shutil.rmtree(build_path)
+            raise
+
+    def clone(self, target):
+        """Create a new environment from the template
+
+        Args:
+            target (str): the path of the new environment, must not exist
+        """
+        self.ensure()
+        target = os.path.abspath(target)
+
+        with open(os.path.join(self.path, ORIGIN_FILENAME)) as f:
+            origin = f.read().encode()
+
+        logger.debug("Clone python environment template '%s' to '%s'", self.path, target)
+
+        for root, dirs, files in os.walk(self.path):
+            rel_root = os.path.relpath(root, self.path)
+            target_root = os.path.normpath(os.path.join(target, rel_root))
+            os.makedirs(target_root)
+
+            # the symlinks (eg. bin/python) are kept as is
+            for name in [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                dirs.remove(name)
+                os.symlink(os.readlink(os.path.join(root, name)), os.path.join(target_root, name))
+
+            for name in files:
+                if name == ORIGIN_FILENAME:
+                    continue
+                source = os.path.join(root, name)
+                destination = os.path.join(target_root, name)
+                if os.path.islink(source):
+                    os.symlink(os.readlink(source), destination)
+                elif self.__is_relocatable(rel_root, name):
+                    self.__relocate(source, destination, origin, target.encode())
+                elif name.endswith('.pth'):
+                    # pip and setuptools may modify these in place, so the template must not share them
+                    shutil.copy2(source, destination)
+                else:
+                    link(source, destination)
+
+    def __is_relocatable(self, rel_root, name):
+        if rel_root == '.':
+            return name in RELOCATABLE_FILES
+        return rel_root.split(os.sep)[0] in RELOCATABLE_DIRS
+
+    def __relocate(self, source, destination, origin, target):
+        with open(source, 'rb') as f:
+            content = f.read()
+        with open(destination, 'wb') as f:
+            f.write(content.replace(origin, target))
+        shutil.copymode(source, destination)
+
+def link(source, destination):
+    """Hard link the file, or copy it if the hard link is not possible (eg. other filesystem)"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)